@@ -0,0 +1,114 @@
+"""
+Throughput vs. number of uvicorn workers.
+
+Starts `uvicorn main:app --workers N` for each N, hammers a cheap endpoint from
+several client processes for a fixed duration and prints requests/s plus how many
+distinct worker pids answered. Session and image state go through the shared
+SQLite stores, so the same server code runs unchanged for every N.
+
+    python benchmarks/bench_workers.py --workers 1 2 4 --duration 10
+"""
+import argparse
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _client(url: str, duration: float, result_queue) -> None:
+    """One load-generating process: sequential keep-alive requests until the deadline."""
+    count, errors, pids = 0, 0, set()
+    deadline = time.perf_counter() + duration
+    with requests.Session() as client:
+        while time.perf_counter() < deadline:
+            try:
+                response = client.get(url, timeout=5)
+                if response.status_code == 200:
+                    count += 1
+                    if "pid" in response.text:
+                        pids.add(response.json()["pid"])
+                else:
+                    errors += 1
+            except requests.RequestException:
+                errors += 1
+    result_queue.put((count, errors, pids))
+
+
+def _wait_until_ready(base_url: str, timeout: float = 60) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(f"{base_url}/api/health", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"Server at {base_url} did not become ready within {timeout}s")
+
+
+def run(workers: int, port: int, path: str, clients: int, duration: float) -> dict:
+    state_dir = tempfile.mkdtemp(prefix="friday-bench-")
+    env = dict(
+        os.environ,
+        SHARED_STATE_DB=os.path.join(state_dir, "shared_state.sqlite3"),
+        SESSION_DB_URL=f"sqlite:///{os.path.join(state_dir, 'sessions.db')}",
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        _wait_until_ready(base_url)
+        result_queue = multiprocessing.Queue()
+        procs = [
+            multiprocessing.Process(target=_client, args=(base_url + path, duration, result_queue))
+            for _ in range(clients)
+        ]
+        for proc in procs:
+            proc.start()
+        results = [result_queue.get() for _ in procs]
+        for proc in procs:
+            proc.join()
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    total = sum(r[0] for r in results)
+    pids = set().union(*(r[2] for r in results))
+    return {
+        "workers": workers,
+        "requests": total,
+        "errors": sum(r[1] for r in results),
+        "rps": total / duration,
+        "distinct_pids": len(pids),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--path", default="/api/health")
+    parser.add_argument("--clients", type=int, default=max(4, os.cpu_count() or 4))
+    parser.add_argument("--duration", type=float, default=10.0)
+    args = parser.parse_args()
+
+    baseline = None
+    print(f"{'workers':>8} {'req/s':>10} {'speedup':>8} {'errors':>7} {'pids':>5}")
+    for workers in args.workers:
+        result = run(workers, args.port, args.path, args.clients, args.duration)
+        baseline = baseline or result["rps"]
+        print(f"{result['workers']:>8} {result['rps']:>10.1f} {result['rps'] / baseline:>7.2f}x "
+              f"{result['errors']:>7} {result['distinct_pids']:>5}")
+
+
+if __name__ == "__main__":
+    main()
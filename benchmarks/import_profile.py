@@ -0,0 +1,91 @@
+"""
+Import-time profile of the server.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter, then prints
+the total import time, the slowest packages and the slowest
+individual modules (self time). With --serve it also starts uvicorn and reports how
+long it takes until /api/health answers.
+
+    python benchmarks/import_profile.py
+    python benchmarks/import_profile.py --module google_search_agent.agent --top 15
+    python benchmarks/import_profile.py --serve
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def profile_imports(module: str):
+    """Returns [(module, self_us, cumulative_us, depth)] as reported by -X importtime."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return rows
+
+
+def time_to_first_response(port: int, timeout: float = 60) -> float:
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            try:
+                if requests.get(f"http://127.0.0.1:{port}/api/health", timeout=0.5).status_code == 200:
+                    return time.perf_counter() - start
+            except requests.RequestException:
+                time.sleep(0.02)
+        raise RuntimeError(f"Server did not answer within {timeout}s")
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--serve", action="store_true", help="also measure uvicorn start to first /api/health response")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    rows = profile_imports(args.module)
+    total_us = next((cumulative for name, _, cumulative, depth in reversed(rows) if name == args.module and depth == 0), 0)
+    print(f"import {args.module}: {total_us / 1e6:.3f}s across {len(rows)} modules")
+
+    packages = defaultdict(int)
+    for name, self_us, _, _ in rows:
+        packages[name.split(".")[0]] += self_us
+    print("\nSlowest packages (sum of module self time):")
+    for name, us in sorted(packages.items(), key=lambda item: -item[1])[: args.top]:
+        print(f"  {us / 1e3:9.1f} ms  {name}")
+
+    print("\nSlowest modules (self time):")
+    for name, self_us, _, _ in sorted(rows, key=lambda row: -row[1])[: args.top]:
+        print(f"  {self_us / 1e3:9.1f} ms  {name}")
+
+    if args.serve:
+        print(f"\nuvicorn start -> first /api/health response: {time_to_first_response(args.port):.3f}s")
+
+
+if __name__ == "__main__":
+    main()
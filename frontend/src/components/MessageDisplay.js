@@ -19,7 +19,7 @@ const MessageDisplay = ({ messages }) => {
     if (message.type === 'image') {
       return (
         <img 
-          src={`data:image/jpeg;base64,${message.content}`}
+          src={`data:${message.mimeType || 'image/jpeg'};base64,${message.content}`}
           alt="Agent response"
           className="message-image"
         />
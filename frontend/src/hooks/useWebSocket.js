@@ -1,4 +1,5 @@
 import { useState, useEffect, useRef, useCallback } from 'react';
+import { applyDeltaFrame, canvasToDisplayData, decodeFrame } from '../utils/screenshotFrames';
 
 export const useWebSocket = (setMessages, setStatus, setIsAgentSpeaking, setGeneratedImages, setShowImageDisplay) => {
   const [websocket, setWebsocket] = useState(null);
@@ -7,12 +8,26 @@ export const useWebSocket = (setMessages, setStatus, setIsAgentSpeaking, setGene
   const reconnectTimeoutRef = useRef(null);
   const reconnectAttempts = useRef(0);
   const maxReconnectAttempts = 5;
+  // Outbound audio codecs we can decode, in order of preference (see pcm-player-processor.js).
+  // mu-law is cheap for the server to encode; ADPCM is smaller but CPU-heavy (server/audio_codec.py).
+  const supportedAudioCodecs = 'ulaw,adpcm,pcm';
   const audioPlayerRef = useRef(null);
   const reinitializeAudioPlayerRef = useRef(null);
+  // Last browser screenshot that delta frames are applied to ({ frameId, data, mimeType } for a
+  // full frame, { frameId, canvas } for an assembled one), and a promise chain so frames are
+  // assembled strictly in arrival order.
+  const lastScreenshotRef = useRef(null);
+  const screenshotChainRef = useRef(Promise.resolve());
 
   const generateSessionId = () => {
     return Math.random().toString().substring(10);
   };
+  // One session id for the life of the page, so a reconnect can resume the server-side run.
+  // The server sends a resume token when a connection opens and numbers every message
+  // (seq); reconnecting with both replays what was missed (see server/live_sessions.py).
+  const sessionIdRef = useRef(generateSessionId());
+  const resumeRef = useRef({ token: null, lastSeq: 0 });
+  const audioModeRef = useRef(false);
 
   const base64ToArrayBuffer = (base64) => {
     const binaryString = window.atob(base64);
@@ -24,10 +39,38 @@ export const useWebSocket = (setMessages, setStatus, setIsAgentSpeaking, setGene
     return bytes.buffer;
   };
 
-  const connectWebSocket = useCallback((audioMode = false) => {
+  // Screenshot encoding profile (see tools/screenshot_encoder.py): smaller WebP frames on
+  // data-saver, slow connections or small screens, full-size JPEG otherwise.
+  const pickBandwidthProfile = () => {
+    const connection = navigator.connection;
+    if (connection && (connection.saveData || ['slow-2g', '2g', '3g'].includes(connection.effectiveType))) {
+      return 'mobile';
+    }
+    return window.screen && window.screen.width <= 768 ? 'mobile' : 'desktop';
+  };
+
+  const toPlayerMessage = (message) => ({
+    codec: message.codec || 'pcm',
+    data: base64ToArrayBuffer(message.data)
+  });
+
+  const connectWebSocket = useCallback((audioMode = false, resume = false) => {
     try {
-      const sessionId = generateSessionId();
-      const wsUrl = `ws://${window.location.host}/ws/${sessionId}?is_audio=${audioMode}`;
+      const sessionId = sessionIdRef.current;
+      if (websocketRef.current) {
+        // Switching audio mode starts a new run; the old socket must not trigger a reconnect
+        websocketRef.current.onclose = null;
+        websocketRef.current.close();
+      }
+      const canResume = resume && resumeRef.current.token && audioMode === audioModeRef.current;
+      if (!canResume) {
+        resumeRef.current = { token: null, lastSeq: 0 };
+      }
+      audioModeRef.current = audioMode;
+      const resumeParams = canResume
+        ? `&resume_token=${encodeURIComponent(resumeRef.current.token)}&last_seq=${resumeRef.current.lastSeq}`
+        : '';
+      const wsUrl = `ws://${window.location.host}/ws/${sessionId}?is_audio=${audioMode}&audio_codecs=${supportedAudioCodecs}&screenshot_deltas=true&bandwidth_profile=${pickBandwidthProfile()}${resumeParams}`;
       
       console.log('Connecting to WebSocket:', wsUrl);
       setStatus('Connecting...');
@@ -48,6 +91,24 @@ export const useWebSocket = (setMessages, setStatus, setIsAgentSpeaking, setGene
           const message = JSON.parse(event.data);
           console.log('WebSocket message received:', message);
 
+          if (message.mime_type === 'session/info') {
+            resumeRef.current.token = message.resume_token;
+            if (message.resumed) {
+              setStatus('Reconnected - Ready to chat');
+            }
+            // Messages that follow are numbered after base_seq; a run that was not resumed
+            // (grace period over, other worker, bad token) starts from 1 again
+            resumeRef.current.lastSeq = message.base_seq ?? (message.resumed ? resumeRef.current.lastSeq : 0);
+            return;
+          }
+          if (message.seq !== undefined) {
+            // Replayed after a reconnect but already handled before the drop
+            if (message.seq <= resumeRef.current.lastSeq) {
+              return;
+            }
+            resumeRef.current.lastSeq = message.seq;
+          }
+
           // Handle interruption
           if (message.interrupted === true) {
             console.log('Handling interruption from server');
@@ -98,12 +159,40 @@ export const useWebSocket = (setMessages, setStatus, setIsAgentSpeaking, setGene
               
               return newMessages;
             });
-          } else if (message.mime_type === 'image/jpeg') {
-            setMessages(prev => [...prev, {
-              type: 'image',
-              content: message.data,
-              timestamp: Date.now()
-            }]);
+          } else if (message.mime_type === 'image/jpeg' || message.mime_type === 'image/webp') {
+            screenshotChainRef.current = screenshotChainRef.current.then(() => {
+              lastScreenshotRef.current = { frameId: message.frame_id, data: message.data, mimeType: message.mime_type };
+              setMessages(prev => [...prev, {
+                type: 'image',
+                content: message.data,
+                mimeType: message.mime_type,
+                timestamp: Date.now()
+              }]);
+            });
+          } else if (message.mime_type === 'image/delta') {
+            // Only the changed tiles of a screenshot; paint them over the previous frame
+            screenshotChainRef.current = screenshotChainRef.current.then(async () => {
+              const base = lastScreenshotRef.current;
+              if (!base || base.frameId !== message.base_frame_id) {
+                console.log('Screenshot delta does not match our last frame, requesting a keyframe');
+                if (ws.readyState === WebSocket.OPEN) {
+                  ws.send(JSON.stringify({ mime_type: 'screenshot/keyframe_request' }));
+                }
+                return;
+              }
+              const canvas = await applyDeltaFrame(base.canvas ?? await decodeFrame(base.data, base.mimeType), message);
+              lastScreenshotRef.current = { frameId: message.frame_id, canvas };
+              const data = canvasToDisplayData(canvas);
+              setMessages(prev => [...prev, {
+                type: 'image',
+                content: data,
+                mimeType: 'image/jpeg',
+                timestamp: Date.now()
+              }]);
+            }).catch((error) => {
+              console.error('Error assembling screenshot delta:', error);
+              lastScreenshotRef.current = null;
+            });
           } else if (message.mime_type === 'image/generated') {
             // Handle generated images
             console.log('Generated image received:', message.filename);
@@ -130,8 +219,8 @@ export const useWebSocket = (setMessages, setStatus, setIsAgentSpeaking, setGene
             
             if (audioPlayerRef.current) {
               try {
-                const audioData = base64ToArrayBuffer(message.data);
-                audioPlayerRef.current.port.postMessage(audioData);
+                const audioMessage = toPlayerMessage(message);
+                audioPlayerRef.current.port.postMessage(audioMessage, [audioMessage.data]);
               } catch (error) {
                 console.error('Error playing audio:', error);
               }
@@ -142,8 +231,8 @@ export const useWebSocket = (setMessages, setStatus, setIsAgentSpeaking, setGene
                 if (newAudioPlayer) {
                   console.log('Audio player reinitialized successfully, playing audio data');
                   try {
-                    const audioData = base64ToArrayBuffer(message.data);
-                    newAudioPlayer.port.postMessage(audioData);
+                    const audioMessage = toPlayerMessage(message);
+                    newAudioPlayer.port.postMessage(audioMessage, [audioMessage.data]);
                     console.log('Audio data sent to reinitialized player');
                   } catch (error) {
                     console.error('Error playing audio after reinitialize:', error);
@@ -170,14 +259,18 @@ export const useWebSocket = (setMessages, setStatus, setIsAgentSpeaking, setGene
         websocketRef.current = null;
         setIsAgentSpeaking(false);
 
-        // Attempt to reconnect
+        // Attempt to reconnect; 1013 means the server is at capacity, so wait longer
+        const serverBusy = event.code === 1013;
         if (reconnectAttempts.current < maxReconnectAttempts) {
-          const delay = Math.min(1000 * Math.pow(2, reconnectAttempts.current), 10000);
-          setStatus(`Connection lost. Reconnecting in ${delay/1000}s...`);
+          const baseDelay = serverBusy ? 5000 : 1000;
+          const delay = Math.min(baseDelay * Math.pow(2, reconnectAttempts.current), serverBusy ? 30000 : 10000);
+          setStatus(serverBusy
+            ? `Server is busy. Retrying in ${delay/1000}s...`
+            : `Connection lost. Reconnecting in ${delay/1000}s...`);
           
           reconnectTimeoutRef.current = setTimeout(() => {
             reconnectAttempts.current++;
-            connectWebSocket();
+            connectWebSocket(audioModeRef.current, !serverBusy);
           }, delay);
         } else {
           setStatus('Connection failed. Please refresh the page.');
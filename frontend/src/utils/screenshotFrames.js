@@ -0,0 +1,33 @@
+// Reassembles browser screenshots sent as delta frames (see tools/screenshot_diff.py).
+// A delta frame only carries the tiles that changed since frame `base_frame_id`;
+// we paint them over that frame on a canvas. The canvas is kept as the base for the next
+// delta, so tiles stay lossless across frames; only the copy shown in the chat is JPEG.
+
+const loadImage = (src) => new Promise((resolve, reject) => {
+  const image = new Image();
+  image.onload = () => resolve(image);
+  image.onerror = reject;
+  image.src = src;
+});
+
+// A full frame (base64, JPEG or WebP depending on the bandwidth profile) as a drawable image.
+export const decodeFrame = (data, mimeType = 'image/jpeg') => loadImage(`data:${mimeType};base64,${data}`);
+
+// base: the image or canvas of the frame the delta applies to. Resolves to a new canvas.
+export const applyDeltaFrame = async (base, frame) => {
+  const canvas = document.createElement('canvas');
+  canvas.width = frame.width;
+  canvas.height = frame.height;
+  const context = canvas.getContext('2d');
+
+  const tiles = await Promise.all(frame.tiles.map((tile) => loadImage(`data:image/png;base64,${tile.data}`)));
+  context.drawImage(base, 0, 0);
+  tiles.forEach((image, i) => {
+    const tile = frame.tiles[i];
+    context.drawImage(image, tile.x, tile.y, tile.w, tile.h);
+  });
+  return canvas;
+};
+
+// base64 JPEG of an assembled frame, for display only.
+export const canvasToDisplayData = (canvas) => canvas.toDataURL('image/jpeg', 0.92).split(',')[1];
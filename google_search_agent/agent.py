@@ -2,20 +2,57 @@ from google.adk.agents import Agent
 from google.adk.tools import google_search
 from google.adk.code_executors import BuiltInCodeExecutor
 from tools.crawl_url import load_page
+from tools.adaptive_fetch import fetch_page
+from tools.page_store import read_page_section, search_fetched_pages
 from tools.browser_tool import (
     browse_url, 
+    browse_urls,
     find_interactive_elements, 
     click_element_by_id, 
     type_into_element_by_id, 
     scroll_page_at_url,
+    run_browser_actions,
     close_browser_session,
     sign_in_to_website,
     analyze_current_view_with_gemini
 )
+from tools.tool_cache import ToolCachePolicy, memoize_tools
+from server.resource_governor import tool_admission_callbacks
+from server.loop_monitor import tool_tagging_callbacks
 from model_generation_agent.agent import image_agent
 # Import Content and Part if they were to be used directly in agent logic, but tools return them.
 # from google.genai.types import Content, Part 
 
+# Which tool results can be reused within a session (ttl, seconds) and which tools change
+# the page they act on (mutates) and so invalidate cached results for that URL. browse_url
+# and find_interactive_elements are not cached; see tools/tool_cache.py.
+TOOL_CACHE_POLICIES = {
+    "fetch_page": ToolCachePolicy(ttl=600, stores_pages=True),
+    "load_page": ToolCachePolicy(ttl=600, stores_pages=True),
+    "click_element_by_id": ToolCachePolicy(mutates=True),
+    "type_into_element_by_id": ToolCachePolicy(mutates=True),
+    "scroll_page_at_url": ToolCachePolicy(mutates=True),
+    "sign_in_to_website": ToolCachePolicy(mutates=True),
+    "run_browser_actions": ToolCachePolicy(mutates=True),
+    "close_browser_session": ToolCachePolicy(resets=True),
+}
+
+# Which tools need a slot from the resource governor before they run (see server/resource_governor.py).
+TOOL_RESOURCES = {
+    "browse_url": "browser",
+    "browse_urls": "browser",
+    "find_interactive_elements": "browser",
+    "click_element_by_id": "browser",
+    "type_into_element_by_id": "browser",
+    "scroll_page_at_url": "browser",
+    "run_browser_actions": "browser",
+    "sign_in_to_website": "browser",
+    "analyze_current_view_with_gemini": "vision",
+}
+before_tool_callback, after_tool_callback = tool_admission_callbacks(TOOL_RESOURCES)
+# Event-loop stalls are attributed to the tool that caused them (see server/loop_monitor.py).
+tag_before_tool, tag_after_tool = tool_tagging_callbacks()
+
 root_agent = Agent(
     name="google_search_agent",
     model="gemini-2.0-flash-live-001",
@@ -24,15 +61,21 @@ root_agent = Agent(
     You are FRIDAY, a helpful assistant to your boss 'Bunny'.
     You can use the following tools to help you:
     - google_search: to search the web for information.
+    - fetch_page: the preferred way to read a page. Returns its content as markdown, using a fast plain HTTP request and switching to a real browser automatically only when the page needs JavaScript. No screenshot is shown.
+    - read_page_section: Long pages returned by fetch_page, browse_url and browse_urls end with a cursor. Call read_page_section with the URL and that cursor to read the next part instantly, without loading the page again. Never browse the same page again just to read further.
+    - search_fetched_pages: Searches all pages you have already fetched in this conversation and returns the best matching passages with their URL and a cursor. Use it to find a specific fact instead of reading long pages section by section.
     - load_page: to load a page and return its content as markdown (useful for static content).
-    - browse_url: Navigates to a URL. Returns the page content as markdown. A screenshot of the page will be displayed to you by the system after this action.
+    - browse_url: Navigates to a URL. Returns the page content as markdown. A screenshot of the page will be displayed to you by the system after this action. Pass fast=True when you only need the text of a page (reading an article, looking up a fact): images, media and trackers are skipped so it loads much faster, but the screenshot will look incomplete. Leave it off for visual tasks, forms and sign-ins.
+    - browse_urls: Loads several URLs at once in parallel browser tabs and returns a list with each page's 'url', 'final_url', 'title' and 'markdown' (or 'error'). Use it instead of several browse_url calls when you need to read multiple pages, e.g. the top search results. Text-only by default; pass screenshots=True to also show each page.
     - find_interactive_elements: After browsing or an action, use this on a URL to find clickable elements (links, buttons) and input fields. 
         It takes the URL and optional keywords. 
         Returns a list of elements, each with an 'id' (which is an XPath string), 'tag', 'text', and 'attributes'. 
         Use the 'id' (XPath) for clicking or typing. This tool itself does NOT trigger a new screenshot display.
+        Prefer compact=True: it returns a short table (handle|tag|text|details) of only the visible, enabled elements, most relevant first (max_elements rows, default 40). Pass the handle number (e.g. "7") as the element id to the click, type and sign-in tools.
     - click_element_by_id: Clicks an element. Provide the URL and the 'id' (XPath) of the element. Returns a status message. A screenshot of the page after the click will be displayed to you by the system.
     - type_into_element_by_id: Types text into an input field. Provide the URL, the 'id' (XPath) of the element, and the text. Returns a status message. A screenshot after typing will be displayed to you by the system.
     - scroll_page_at_url: Scrolls the current page. Provide the URL and direction ("up", "down", "top", "bottom"). Returns a status message. A screenshot after scrolling will be displayed to you by the system.
+    - run_browser_actions: Runs several steps on a page in one call, in order, and shows one screenshot at the end. Provide the URL and a list of action strings: "click <id>", "type <id> <text>", "enter <id>", "scroll <up|down|top|bottom>", "wait <seconds>" (waits add up to at most 3 seconds per call). Stops at the first failing step and returns each step's status and timing. Prefer it for multi-step flows such as filling in and submitting a form.
     - sign_in_to_website: Signs into a website. Provide the login page URL, XPaths for the username field, password field, and submit button, and the username and password. Returns a status message. A screenshot after the sign-in attempt will be displayed by the system.
     - analyze_current_view_with_gemini: Captures the current browser view, sends it with your specified prompt to a vision model for analysis, and returns the textual description or answer. Use this if you need to understand visual elements not easily parsed from text/markdown, or to get a specific visual question answered about the current page. Example prompt to this tool: "What is the main color of the navigation bar?" or "Is there a large image in the center of the page?". This tool operates on the current view; ensure you've navigated to the correct page first.
     - close_browser_session: Call this when you are finished with all browser tasks to close the browser. Returns a confirmation message.
@@ -49,22 +92,31 @@ root_agent = Agent(
         c. Finally, call `sign_in_to_website` with the login page URL, the identified XPaths, and the credentials (username, password). The system will provide a screenshot after the attempt.
     5. After an action, analyze the returned text and the screenshot provided by the system. The URL might change. You may need to call `find_interactive_elements` again on the current URL to understand the new page state.
     6. If you need to scroll, use `scroll_page_at_url`. This returns a status, and the system will show you a new screenshot.
+       When you already know several steps (e.g. type into three fields, then click submit), do them with one `run_browser_actions` call instead of one call per step.
     7. When all browsing tasks for a particular goal are complete, call `close_browser_session`.
     Remember to use the visual information from the screenshots provided by the system to confirm the state of the page after using `browse_url`, `click_element_by_id`, `type_into_element_by_id`, `scroll_page_at_url`, and `sign_in_to_website`.
+    If a tool answers that the server is at capacity, tell Bunny and offer to try again shortly; do not retry it immediately.
     IMPORTANT: Always add some wittiness and humour to your responses just like JARVIS will respond to TONY STARK.
     """,
     code_executor=BuiltInCodeExecutor(),
-    tools=[
+    tools=memoize_tools([
         google_search,
+        fetch_page,
+        read_page_section,
+        search_fetched_pages,
         load_page, 
         browse_url, 
+        browse_urls,
         find_interactive_elements, 
         click_element_by_id, 
         type_into_element_by_id, 
         scroll_page_at_url,
+        run_browser_actions,
         sign_in_to_website,
         close_browser_session,
         analyze_current_view_with_gemini
-        ],
+        ], TOOL_CACHE_POLICIES),
+    before_tool_callback=[tag_before_tool, before_tool_callback],
+    after_tool_callback=[after_tool_callback, tag_after_tool],
     sub_agents=[image_agent]
 )
\ No newline at end of file
@@ -16,31 +16,42 @@ import os
 import json
 import asyncio
 import base64
+import time
 
 from pathlib import Path
 from dotenv import load_dotenv
 
-from google.genai.types import (
-    # Part, # No longer directly used here for tool outputs
-    Content, # Still used for sending to agent
-    Blob,
-    Part, # Still needed for sending text to agent
-)
-
-from google.adk.runners import Runner
-from google.adk.agents import LiveRequestQueue
-from google.adk.agents.run_config import RunConfig
-from google.adk.sessions.in_memory_session_service import InMemorySessionService
-from google.genai import types
-from google.adk.events import Event # For type hinting if needed, and checking event types
-
+# google.adk / google.genai and the agent tree take seconds to import, so they are
+# imported where they are used (and preloaded by the startup warm-up task) instead of
+# here; see benchmarks/import_profile.py.
 
-from fastapi import FastAPI, WebSocket
+from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
-
-from google_search_agent.agent import root_agent
-from tools.browser_tool import SCREENSHOT_ACTION_FILENAME # Import the screenshot filename
+from fastapi.responses import FileResponse, Response
+
+from tools.browser_tool import (
+    pop_screenshot_captures,
+    configure_screenshots,
+    drop_screenshot_settings,
+    request_keyframe,
+    close_browser_for_session,
+    resolve_chromedriver_path,
+    warm_up_browser,
+    shutdown_spare_browser,
+    BROWSER_WARMUP,
+)
+from tools.session_context import current_session_id
+from tools.screenshot_encoder import render_frame
+from tools.page_store import drop_session_pages
+from tools.tool_cache import drop_session_tool_cache
+from server.shared_state import claim_image_event, get_image, list_images
+from server.image_store import find_session_image, image_file, image_relpath, run_image_gc
+from server.audio_codec import negotiate_codec, create_encoder
+from server.static_assets import PrecompressedAssets
+from server import metrics
+from server.resource_governor import governor
+from server.live_sessions import LiveSession, get_live_session, register_live_session
+from server.loop_monitor import LOOP_MONITOR_ENABLED, monitor as loop_monitor, tag_task
 
 #
 # ADK Streaming
@@ -54,7 +65,41 @@ print(os.getenv("GOOGLE_API_KEY"))
 
 
 APP_NAME = "ADK Streaming example"
-session_service = InMemorySessionService()
+
+# Sessions must live outside the process when running more than one uvicorn worker
+# (`uvicorn main:app --workers N`), e.g. SESSION_DB_URL=sqlite:///assets/sessions.db.
+SESSION_DB_URL = os.getenv("SESSION_DB_URL")
+_session_service = None
+
+
+def get_session_service():
+    """Creates the ADK session service on first use."""
+    global _session_service
+    if _session_service is None:
+        if SESSION_DB_URL:
+            from google.adk.sessions import DatabaseSessionService
+            _session_service = DatabaseSessionService(db_url=SESSION_DB_URL)
+        else:
+            from google.adk.sessions.in_memory_session_service import InMemorySessionService
+            _session_service = InMemorySessionService()
+    return _session_service
+
+
+def load_agent_modules():
+    """Imports ADK and the agent tree. Blocking; the startup hook runs it in a thread."""
+    start_time = time.perf_counter()
+    import google_search_agent.agent  # noqa: F401 - pulls in ADK, google.genai and the tool modules
+    print(f"[WARM_UP]: Agent modules loaded in {time.perf_counter() - start_time:.2f}s")
+
+
+def warm_up_browser_driver():
+    """Resolves chromedriver (and pre-launches Chrome if BROWSER_WARMUP=1). Blocking; runs in a thread."""
+    start_time = time.perf_counter()
+    if BROWSER_WARMUP:
+        warm_up_browser()
+    else:
+        resolve_chromedriver_path()
+    print(f"[WARM_UP]: Browser warm-up finished in {time.perf_counter() - start_time:.2f}s")
 
 
 # This function seems to be unused now that session creation is in the endpoint.
@@ -63,99 +108,84 @@ session_service = InMemorySessionService()
 #     pass 
 
 
-async def poll_for_generated_image(websocket, max_wait_time=15):
-    """Poll for newly generated images and send them to the client"""
-    import time
+async def poll_for_generated_image(live, session_id, max_wait_time=15):
+    """Poll for images generated for this session and send them to the client.
+
+    create_image publishes an event to the shared state DB, so this works no matter
+    which worker process generated the image, and never picks up other sessions' images.
+    """
     start_time = time.time()
     
-    print(f"[POLL_IMAGE]: Starting to poll for generated images (max {max_wait_time}s)")
-    
-    # Get baseline of existing images before polling starts
-    images_dir = Path("assets/images")
-    baseline_images = set()
-    if images_dir.exists():
-        baseline_images = {f.name for f in images_dir.iterdir() if f.is_file() and f.suffix.lower() in ['.png', '.jpg', '.jpeg']}
-        print(f"[POLL_IMAGE]: Baseline images: {baseline_images}")
-        
-        # Check if there are any very recent images (created in the last 3 seconds)
-        recent_threshold = start_time - 3  # 3 seconds ago
-        recent_images = []
-        for f in images_dir.iterdir():
-            if f.is_file() and f.suffix.lower() in ['.png', '.jpg', '.jpeg']:
-                if f.stat().st_mtime > recent_threshold:
-                    recent_images.append(f)
-        
-        if recent_images:
-            latest_recent = max(recent_images, key=lambda f: f.stat().st_mtime)
-            print(f"[POLL_IMAGE]: Found very recent image: {latest_recent} (age: {start_time - latest_recent.stat().st_mtime:.1f}s)")
-            
-            # Send this recent image immediately
-            try:
-                with open(latest_recent, "rb") as f_img:
-                    image_data = f_img.read()
-                
-                image_message = {
-                    "mime_type": "image/generated",
-                    "data": base64.b64encode(image_data).decode("utf-8"),
-                    "filename": latest_recent.name
-                }
-                await websocket.send_text(json.dumps(image_message))
-                print(f"[POLL_IMAGE]: Immediately sent recent image {latest_recent.name} ({len(image_data)} bytes)")
-                return  # Stop polling after sending the recent image
-            except Exception as e:
-                print(f"[POLL_IMAGE ERROR]: Failed to send recent image {latest_recent}: {e}")
-    else:
-        print(f"[POLL_IMAGE]: Images directory does not exist: {images_dir}")
+    print(f"[POLL_IMAGE]: Starting to poll for generated images for session {session_id} (max {max_wait_time}s)")
     
     poll_count = 0
     while time.time() - start_time < max_wait_time:
         try:
             poll_count += 1
-            await asyncio.sleep(0.8)  # Check every 800ms to give more time for generation
-            
-            print(f"[POLL_IMAGE]: Poll #{poll_count} at {time.time() - start_time:.1f}s")
-            
-            if images_dir.exists():
-                current_images = {f.name for f in images_dir.iterdir() if f.is_file() and f.suffix.lower() in ['.png', '.jpg', '.jpeg']}
-                new_images = current_images - baseline_images
-                
-                print(f"[POLL_IMAGE]: Current images: {current_images}")
-                print(f"[POLL_IMAGE]: New images: {new_images}")
-                
-                if new_images:
-                    # Found new images, get the most recent one
-                    image_files = [images_dir / name for name in new_images]
-                    latest_image = max(image_files, key=lambda f: f.stat().st_mtime)
-                    print(f"[POLL_IMAGE]: Found new image: {latest_image}")
-                    
-                    # Wait a bit more to ensure the file is fully written
-                    await asyncio.sleep(0.5)
+            filename = claim_image_event(session_id)
+            if filename:
+                # The manifest knows where the session's image is; no directory lookups
+                latest_image = find_session_image(session_id, filename)
+                print(f"[POLL_IMAGE]: Found new image: {latest_image}")
+                try:
+                    if latest_image is None:
+                        raise FileNotFoundError(f"{filename} is not in the image manifest")
+                    image_data = await asyncio.to_thread(Path(latest_image).read_bytes)
                     
-                    try:
-                        with open(latest_image, "rb") as f_img:
-                            image_data = f_img.read()
-                        
-                        image_message = {
-                            "mime_type": "image/generated",
-                            "data": base64.b64encode(image_data).decode("utf-8"),
-                            "filename": latest_image.name
-                        }
-                        await websocket.send_text(json.dumps(image_message))
-                        print(f"[POLL_IMAGE]: Successfully sent generated image {latest_image.name} ({len(image_data)} bytes)")
-                        return  # Stop polling after sending one image
-                    except Exception as e:
-                        print(f"[POLL_IMAGE ERROR]: Failed to read/send image {latest_image}: {e}")
-                        continue
-            else:
-                print(f"[POLL_IMAGE]: Images directory not found during poll #{poll_count}")
+                    image_message = {
+                        "mime_type": "image/generated",
+                        "data": base64.b64encode(image_data).decode("utf-8"),
+                        "filename": filename,
+                        "url": f"/api/images/{image_relpath(session_id, filename)}",
+                    }
+                    await live.send(image_message)
+                    print(f"[POLL_IMAGE]: Successfully sent generated image {filename} ({len(image_data)} bytes)")
+                    return  # Stop polling after sending one image
+                except Exception as e:
+                    print(f"[POLL_IMAGE ERROR]: Failed to read/send image {latest_image}: {e}")
+                    continue
+            await asyncio.sleep(0.8)  # Check every 800ms to give more time for generation
         except Exception as e:
             print(f"[POLL_IMAGE ERROR]: Poll #{poll_count} failed: {e}")
             break
     
     print(f"[POLL_IMAGE]: Finished polling after {time.time() - start_time:.1f}s and {poll_count} polls - no new images found")
 
-async def agent_to_client_messaging(websocket, live_events):
-    """Agent to client communication, handles multi-part messages and screenshot sending."""
+def screenshot_frame_message(frame):
+    """Builds the WebSocket message for a screenshot frame; None if the page did not change.
+
+    Full frames keep the original image message shape ("image/jpeg", or "image/webp" for the
+    mobile bandwidth profile). Delta frames carry only the changed tiles, which the client
+    pastes onto frame `base_frame_id`.
+    """
+    if frame["type"] == "unchanged":
+        return None
+    message = {
+        "mime_type": frame["mime_type"] if frame["type"] == "full" else "image/delta",
+        "frame_id": frame["frame_id"],
+        "width": frame["width"],
+        "height": frame["height"],
+    }
+    if frame["type"] == "full":
+        message["data"] = base64.b64encode(frame["data"]).decode("utf-8")
+    else:
+        message["base_frame_id"] = frame["base_frame_id"]
+        message["tiles"] = [
+            {"x": tile["x"], "y": tile["y"], "w": tile["w"], "h": tile["h"],
+             "data": base64.b64encode(tile["data"]).decode("utf-8")}
+            for tile in frame["tiles"]
+        ]
+    return message
+
+
+async def agent_to_client_messaging(live, live_events, session_id, audio_encoder=None):
+    """Agent to client communication, handles multi-part messages and screenshot sending.
+
+    Messages go through the LiveSession, which numbers and buffers them, so output produced
+    while the client is reconnecting is replayed instead of lost.
+    """
+    if audio_encoder is None:
+        audio_encoder = create_encoder("pcm")
     while True:
         async for event in live_events:
             # Enhanced logging for ADK event stream
@@ -188,7 +218,7 @@ async def agent_to_client_messaging(websocket, live_events):
                     "interrupted": event.interrupted,
                 }
                 print(f"[AGENT TO CLIENT SENDING]: Turn status: {message}")
-                await websocket.send_text(json.dumps(message))
+                await live.send(message)
                 print(f"[AGENT TO CLIENT SENT]: Turn status: {message}")
                 continue
 
@@ -215,11 +245,17 @@ async def agent_to_client_messaging(websocket, live_events):
                     if part.inline_data and part.inline_data.mime_type.startswith("audio/pcm"):
                         audio_data = part.inline_data.data
                         if audio_data:
+                            if audio_encoder.blocking:
+                                # Chunks are still encoded one at a time, in order, so the encoder state stays continuous
+                                encoded_audio = await asyncio.to_thread(audio_encoder.encode, audio_data)
+                            else:
+                                encoded_audio = audio_encoder.encode(audio_data)
                             message_to_send = {
                                 "mime_type": "audio/pcm",
-                                "data": base64.b64encode(audio_data).decode("ascii")
+                                "codec": audio_encoder.name,
+                                "data": base64.b64encode(encoded_audio).decode("ascii")
                             }
-                            log_message = f"audio/pcm: {len(audio_data)} bytes."
+                            log_message = f"audio/pcm ({audio_encoder.name}): {len(audio_data)} -> {len(encoded_audio)} bytes."
                     # REMOVED: Direct image handling from part.inline_data for tool responses
                     # elif part.inline_data and part.inline_data.mime_type.startswith("image/jpeg"):
                     # ...
@@ -256,11 +292,11 @@ async def agent_to_client_messaging(websocket, live_events):
                         if tool_name_if_any == "create_image":
                             print(f"[IMMEDIATE_IMAGE_CHECK]: create_image function call detected, will poll for new images")
                             # Start a background task to poll for images
-                            asyncio.create_task(poll_for_generated_image(websocket))
+                            asyncio.create_task(poll_for_generated_image(live, session_id))
                         elif "image" in tool_name_if_any.lower() or tool_name_if_any == "long_running_tool":
                             print(f"[IMMEDIATE_IMAGE_CHECK]: Image-related function call detected ({tool_name_if_any}), will poll for new images")
                             # Start a background task to poll for images
-                            asyncio.create_task(poll_for_generated_image(websocket))
+                            asyncio.create_task(poll_for_generated_image(live, session_id))
                     elif part.code_execution_result:
                         # Ensure output is treated as a string
                         output_str = str(part.code_execution_result.output if part.code_execution_result.output is not None else "")
@@ -277,33 +313,35 @@ async def agent_to_client_messaging(websocket, live_events):
                         # So, is_tool_response_text remains false here, and tool_name_if_any is not set for screenshot logic based on this part.
                     
                     if message_to_send:
-                        await websocket.send_text(json.dumps(message_to_send))
+                        await live.send(message_to_send)
                         print(f"[AGENT TO CLIENT]: {log_message}")
                     else:
                         print(f"[AGENT TO CLIENT]: Skipping empty or unhandled part: {part}")
                 
                 # After processing all parts, check for screenshot or generated images
                 # Check both for tool response text AND function calls
-                browser_tools_that_screenshot = ["browse_url", "click_element_by_id", "type_into_element_by_id", "scroll_page_at_url"]
+                browser_tools_that_screenshot = ["browse_url", "browse_urls", "click_element_by_id", "type_into_element_by_id", "scroll_page_at_url", "run_browser_actions", "sign_in_to_website"]
                 image_generation_tools = ["create_image", "long_running_tool"]
 
                 if (is_tool_response_text or function_call_detected) and tool_name_if_any in browser_tools_that_screenshot:
-                    print(f"[AGENT TO CLIENT]: Tool '{tool_name_if_any}' text response sent, checking for screenshot: {SCREENSHOT_ACTION_FILENAME}")
-                    if os.path.exists(SCREENSHOT_ACTION_FILENAME):
+                    captures = pop_screenshot_captures(session_id)
+                    if not captures:
+                        print(f"[AGENT TO CLIENT]: No screenshot captured after tool {tool_name_if_any} execution.")
+                    for capture in captures: # browse_urls can queue one screenshot per tab
                         try:
-                            with open(SCREENSHOT_ACTION_FILENAME, "rb") as f_img:
-                                image_data = f_img.read()
-                            
-                            screenshot_message = {
-                                "mime_type": "image/jpeg",
-                                "data": base64.b64encode(image_data).decode("utf-8")
-                            }
-                            await websocket.send_text(json.dumps(screenshot_message))
-                            print(f"[AGENT TO CLIENT]: Sent screenshot {SCREENSHOT_ACTION_FILENAME} ({len(image_data)} bytes).")
-                        except Exception as e_screenshot:
-                            print(f"[AGENT TO CLIENT ERROR]: Failed to read/send screenshot {SCREENSHOT_ACTION_FILENAME}: {e_screenshot}")
-                    else:
-                        print(f"[AGENT TO CLIENT]: Screenshot file {SCREENSHOT_ACTION_FILENAME} not found after tool {tool_name_if_any} execution.")
+                            frame = await render_frame(*capture)
+                        except Exception as e_render:
+                            print(f"[AGENT TO CLIENT ERROR]: Failed to encode screenshot: {e_render}")
+                            continue
+                        screenshot_message = screenshot_frame_message(frame)
+                        if screenshot_message:
+                            try:
+                                await live.send(screenshot_message)
+                                print(f"[AGENT TO CLIENT]: Sent {frame['type']} screenshot frame {frame['frame_id']} after tool {tool_name_if_any}.")
+                            except Exception as e_screenshot:
+                                print(f"[AGENT TO CLIENT ERROR]: Failed to send screenshot frame: {e_screenshot}")
+                        else:
+                            print(f"[AGENT TO CLIENT]: Screenshot unchanged after tool {tool_name_if_any}, nothing sent.")
                 
                 # For image generation tools, we rely on the polling mechanism started by function_call detection
                 elif (is_tool_response_text or function_call_detected) and tool_name_if_any in image_generation_tools:
@@ -313,7 +351,7 @@ async def agent_to_client_messaging(websocket, live_events):
                 elif is_tool_response_text and any(part.text and ("image" in part.text.lower() or "generated" in part.text.lower() or "created" in part.text.lower()) for part in event.content.parts if part.text):
                     print(f"[AGENT TO CLIENT]: Potential image generation detected in text response - starting fallback polling")
                     # Start polling as fallback
-                    asyncio.create_task(poll_for_generated_image(websocket))
+                    asyncio.create_task(poll_for_generated_image(live, session_id))
                 
                 # Note: Removed immediate image checking to rely on polling mechanism for better timing control
 
@@ -321,13 +359,22 @@ async def agent_to_client_messaging(websocket, live_events):
                  print(f"[AGENT TO CLIENT]: Event has content but no parts: {event.content}")
 
 
-async def client_to_agent_messaging(websocket, live_request_queue):
+async def client_to_agent_messaging(websocket, live_request_queue, session_id):
     """Client to agent communication"""
+    from google.genai.types import Blob, Content, Part
+
     while True:
         # Decode JSON message
         message_json = await websocket.receive_text()
         message = json.loads(message_json)
         mime_type = message["mime_type"]
+
+        # The client could not apply a screenshot delta; next screenshot goes out in full
+        if mime_type == "screenshot/keyframe_request":
+            request_keyframe(session_id)
+            print(f"[CLIENT TO AGENT]: Keyframe requested for session {session_id}")
+            continue
+
         data = message["data"]
 
         # Send the message to the agent
@@ -351,50 +398,146 @@ async def client_to_agent_messaging(websocket, live_request_queue):
 #
 
 app = FastAPI()
+_agent_modules_task = None
+_browser_warm_up_task = None
+_image_gc_task = None
+
+
+@app.on_event("startup")
+async def start_warm_up():
+    """Starts the warm-up in the background so the server begins serving immediately."""
+    global _agent_modules_task, _browser_warm_up_task
+    _agent_modules_task = asyncio.create_task(asyncio.to_thread(load_agent_modules))
+    _browser_warm_up_task = asyncio.create_task(asyncio.to_thread(warm_up_browser_driver))
+
+
+@app.on_event("startup")
+async def start_image_gc():
+    """Keeps the image manifest in sync and generated images within their quotas (see server/image_store.py)."""
+    global _image_gc_task
+    _image_gc_task = asyncio.create_task(run_image_gc())
+
+
+@app.on_event("startup")
+async def start_loop_monitor():
+    """Watches for code blocking the event loop (see server/loop_monitor.py)."""
+    if LOOP_MONITOR_ENABLED:
+        loop_monitor.start()
+
+
+@app.on_event("shutdown")
+async def stop_spare_browser():
+    await asyncio.to_thread(shutdown_spare_browser)
+
+
+@app.on_event("shutdown")
+async def stop_image_gc():
+    if _image_gc_task is not None:
+        _image_gc_task.cancel()
+
+
+@app.on_event("shutdown")
+async def stop_loop_monitor():
+    loop_monitor.stop()
+
+
+@app.get("/api/health")
+async def health():
+    """Liveness probe; reports the worker pid so load spread across workers is visible."""
+    return {"status": "ok", "pid": os.getpid()}
+
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """Counters, gauges and latency histograms of this worker (WebDriver round trips, resource queues, ...)."""
+    return metrics.snapshot()
+
+
+@app.get("/api/loop-stalls")
+async def get_loop_stalls():
+    """The latest event-loop stalls of this worker, with the session, tool and stack that blocked the loop."""
+    return {"pid": os.getpid(), "threshold_ms": loop_monitor.threshold * 1000, "stalls": loop_monitor.recent_stalls()}
+
+
+# Serve generated images ("<session id>/<name>", or a name from the old flat folder)
+@app.get("/api/images/{image_path:path}")
+async def serve_image(image_path: str):
+    """Serves a generated image, looked up in the image manifest"""
+    entry = await asyncio.to_thread(get_image, image_path, True)
+    if entry is None:
+        return {"error": "Image not found"}
+    return FileResponse(image_file(entry["path"]), headers={"ETag": f'"{entry["sha256"]}"'})
+
+
+# Gallery of one session's generated images, newest first
+@app.get("/api/sessions/{session_id}/images")
+async def session_images(session_id: str):
+    """Lists a session's generated images from the image manifest"""
+    entries = await asyncio.to_thread(list_images, session_id)
+    return {
+        "session_id": session_id,
+        "images": [
+            {
+                "name": entry["name"],
+                "url": f"/api/images/{entry['path']}",
+                "size": entry["size"],
+                "sha256": entry["sha256"],
+                "created_at": entry["created_at"],
+                "last_access": entry["last_access"],
+            }
+            for entry in entries
+        ],
+    }
+
 
 # Serve React build files
 REACT_BUILD_DIR = Path("frontend/build")
 if REACT_BUILD_DIR.exists():
+    # The build is read and gzip/brotli-compressed into memory by a startup task; until
+    # then files are served from disk.
+    build_assets = PrecompressedAssets(REACT_BUILD_DIR)
+
+    @app.on_event("startup")
+    async def precompress_build_assets():
+        asyncio.create_task(asyncio.to_thread(build_assets.build))
+
     # Serve static assets (JS, CSS, etc.)
-    app.mount("/static", StaticFiles(directory=REACT_BUILD_DIR / "static"), name="static")
+    @app.get("/static/{path:path}")
+    async def static_asset(path: str, request: Request):
+        """Serves hashed build assets with immutable caching"""
+        return build_assets.response(f"static/{path}", request) or Response(status_code=404)
     
     @app.get("/")
-    async def root():
+    async def root(request: Request):
         """Serves the React index.html"""
-        return FileResponse(REACT_BUILD_DIR / "index.html")
+        return build_assets.response("index.html", request)
     
     # Serve audio worklet files directly from build directory
     @app.get("/pcm-player-processor.js")
-    async def pcm_player_processor():
+    async def pcm_player_processor(request: Request):
         """Serves the PCM player processor worklet"""
-        return FileResponse(REACT_BUILD_DIR / "pcm-player-processor.js", media_type="application/javascript")
+        return build_assets.response("pcm-player-processor.js", request, media_type="application/javascript")
     
     @app.get("/pcm-recorder-processor.js")
-    async def pcm_recorder_processor():
+    async def pcm_recorder_processor(request: Request):
         """Serves the PCM recorder processor worklet"""
-        return FileResponse(REACT_BUILD_DIR / "pcm-recorder-processor.js", media_type="application/javascript")
-    
-    # Serve images from assets/images directory
-    @app.get("/api/images/{image_name}")
-    async def serve_image(image_name: str):
-        """Serves images from assets/images directory"""
-        image_path = Path("assets/images") / image_name
-        if image_path.exists() and image_path.is_file():
-            return FileResponse(image_path)
-        else:
-            return {"error": "Image not found"}
+        return build_assets.response("pcm-recorder-processor.js", request, media_type="application/javascript")
     
     # Catch-all route for React Router (SPA routing)
     @app.get("/{path:path}")
-    async def catch_all(path: str):
+    async def catch_all(path: str, request: Request):
         """Catch-all route for React Router"""
         # Check if it's an API route or WebSocket
         if path.startswith("ws/") or path.startswith("api/"):
             return {"error": "Not found"}
+        # Top-level build files (manifest.json, favicon.ico, logos, ...)
+        asset_response = build_assets.response(path, request)
+        if asset_response is not None:
+            return asset_response
         # Don't serve index.html for .js files
         if path.endswith(".js"):
             return {"error": "Not found"}
-        return FileResponse(REACT_BUILD_DIR / "index.html")
+        return build_assets.response("index.html", request)
 else:
     # Fallback to old static directory if React build doesn't exist
     STATIC_DIR = Path("static")
@@ -406,19 +549,112 @@ async def root():
     return FileResponse(os.path.join(STATIC_DIR, "index.html"))
 
 
+def release_session_resources(session_id):
+    """Quits the session's browser (releasing its ownership lease) and drops its per-session state."""
+    print(f"Client #{session_id} session closed")
+    close_browser_for_session(session_id)
+    drop_screenshot_settings(session_id)
+    drop_session_pages(session_id)
+    drop_session_tool_cache(session_id)
+    governor.release_session(session_id)
+
+
+async def serve_live_connection(websocket, live, session_id, last_seq=None):
+    """Runs one client connection of a live session until the client drops or the run ends.
+
+    When the client drops, the session is detached and kept for a reconnect instead of closed.
+    """
+    try:
+        replay_complete = await live.attach(websocket, last_seq)
+    except Exception as e:
+        print(f"Client #{session_id} dropped while attaching: {e}")
+        live.detach(websocket)
+        return
+    if not replay_complete:
+        # Some missed frames are gone, possibly the screenshot later deltas build on
+        request_keyframe(session_id)
+    client_to_agent_task = asyncio.create_task(
+        client_to_agent_messaging(websocket, live.live_request_queue, session_id)
+    )
+    tag_task(client_to_agent_task, session=session_id)
+    done, pending = await asyncio.wait(
+        [live.agent_task, client_to_agent_task],
+        return_when=asyncio.FIRST_COMPLETED,
+    )
+    if live.agent_task not in done:
+        error = client_to_agent_task.exception()
+        if error is None or isinstance(error, WebSocketDisconnect):
+            print(f"Client #{session_id} disconnected")
+            live.detach(websocket)
+            return
+        raise error
+    client_to_agent_task.cancel()
+    if not live.agent_task.cancelled() and live.agent_task.exception():
+        raise live.agent_task.exception()
+    await live.close()
+
+
 @app.websocket("/ws/{session_id}")
-async def websocket_endpoint(websocket: WebSocket, session_id: str, is_audio: str):
+async def websocket_endpoint(websocket: WebSocket, session_id: str, is_audio: str, audio_codecs: str = "", screenshot_deltas: str = "false", bandwidth_profile: str = "desktop", resume_token: str = "", last_seq: int = 0):
     """Client websocket endpoint"""
     await websocket.accept()
-    print(f"Client #{session_id} connected, audio mode: {is_audio}")
+
+    # A reconnect within the grace period takes over the running session (see server/live_sessions.py)
+    live = get_live_session(session_id)
+    if live is not None:
+        if live.can_resume(resume_token, is_audio == "true"):
+            print(f"Client #{session_id} reconnected, resuming live session after seq {last_seq}")
+            try:
+                await serve_live_connection(websocket, live, session_id, last_seq)
+            except Exception as e:
+                print(f"[WEBSOCKET ERROR] for client #{session_id}: {e}")
+                await live.close(code=1011, reason=f"Server error: {e}")
+            return
+        # A new run of this session (audio mode switched, or another tab) replaces the old one
+        await live.close(code=1000, reason="Replaced by a new session")
+        live = None
+
+    # Live sessions are admitted by the resource governor; when the server is saturated the
+    # client gets close code 1013 (try again later) and backs off.
+    governor.register_session(session_id, websocket.client.host if websocket.client else session_id)
+    if not await governor.acquire("session", session_id):
+        print(f"Client #{session_id} rejected: no free live session slot")
+        governor.release_session(session_id)
+        await websocket.close(code=1013, reason="Server busy, try again later")
+        return
+    audio_codec = negotiate_codec(audio_codecs)
+    print(f"Client #{session_id} connected, audio mode: {is_audio}, audio codec: {audio_codec} (offered: {audio_codecs or 'none'})")
+
+    # Tools look up the session (browser, screenshots, image events) through this.
+    current_session_id.set(session_id)
+    configure_screenshots(session_id, deltas=screenshot_deltas == "true", profile=bandwidth_profile)
 
     try:
-        session = await session_service.create_session(
+        # Wait for the background import instead of importing on the event loop.
+        if _agent_modules_task is not None:
+            await _agent_modules_task
+        from google.adk.agents import LiveRequestQueue
+        from google.adk.agents.run_config import RunConfig
+        from google.adk.runners import Runner
+        from google.genai import types
+        from google_search_agent.agent import root_agent
+
+        session_service = get_session_service()
+
+        session = await session_service.get_session(
             app_name=APP_NAME,
-            user_id=session_id, 
-            session_id=session_id, 
+            user_id=session_id,
+            session_id=session_id,
         )
-        print(f"ADK Session created for {session_id}: {session}")
+        if session is None:
+            session = await session_service.create_session(
+                app_name=APP_NAME,
+                user_id=session_id, 
+                session_id=session_id, 
+            )
+            print(f"ADK Session created for {session_id}: {session}")
+        else:
+            print(f"ADK Session resumed from shared store for {session_id}")
 
         runner = Runner(
             app_name=APP_NAME,
@@ -445,38 +681,20 @@ async def websocket_endpoint(websocket: WebSocket, session_id: str, is_audio: st
             run_config=run_config,
         )
 
-        agent_to_client_task = asyncio.create_task(
-            agent_to_client_messaging(websocket, live_events)
-        )
-        client_to_agent_task = asyncio.create_task(
-            client_to_agent_messaging(websocket, live_request_queue)
-        )
-        
-        done, pending = await asyncio.wait(
-            [agent_to_client_task, client_to_agent_task],
-            return_when=asyncio.FIRST_COMPLETED,
-        )
-
-        for task in pending:
-            task.cancel()
-        for task in done: 
-            if task.exception():
-                raise task.exception()
+        # The run outlives this connection: it is kept for RESUME_GRACE_SECONDS after a drop
+        live = LiveSession(session_id, is_audio == "true", live_request_queue,
+                           on_close=lambda: release_session_resources(session_id))
+        live.start(agent_to_client_messaging(live, live_events, session_id, create_encoder(audio_codec)))
+        register_live_session(live)
+        await serve_live_connection(websocket, live, session_id)
 
     except Exception as e:
         print(f"[WEBSOCKET ERROR] for client #{session_id}: {e}")
-        try:
-            await websocket.close(code=1011, reason=f"Server error: {e}")
-        except RuntimeError: 
-            pass
-    finally:
-        print(f"Client #{session_id} disconnected")
-        # Cleanup screenshot file on disconnect if it exists
-        if os.path.exists(SCREENSHOT_ACTION_FILENAME):
+        if live is not None:
+            await live.close(code=1011, reason=f"Server error: {e}")
+        else:
             try:
-                os.remove(SCREENSHOT_ACTION_FILENAME)
-                print(f"[CLEANUP] Removed {SCREENSHOT_ACTION_FILENAME} on disconnect.")
-            except Exception as e_remove:
-                print(f"[CLEANUP ERROR] Failed to remove {SCREENSHOT_ACTION_FILENAME}: {e_remove}")
-        # from tools.browser_tool import close_browser_session 
-        # close_browser_session() # Consider session-specific browser cleanup if needed
\ No newline at end of file
+                await websocket.close(code=1011, reason=f"Server error: {e}")
+            except RuntimeError: 
+                pass
+            release_session_resources(session_id)
@@ -3,11 +3,18 @@ from google.adk.tools import google_search, LongRunningFunctionTool
 from google.adk.code_executors import BuiltInCodeExecutor
 from tools.crawl_url import load_page
 from tools.create_image import create_image
+from server.resource_governor import tool_admission_callbacks
+from server.loop_monitor import tool_tagging_callbacks
 # Import Content and Part if they were to be used directly in agent logic, but tools return them.
 # from google.genai.types import Content, Part 
 
 long_running_tool = LongRunningFunctionTool(func=create_image)
 
+# Image generation jobs wait for a slot from the resource governor (see server/resource_governor.py).
+before_tool_callback, after_tool_callback = tool_admission_callbacks({"create_image": "image"})
+# Event-loop stalls are attributed to the tool that caused them (see server/loop_monitor.py).
+tag_before_tool, tag_after_tool = tool_tagging_callbacks()
+
 image_agent = Agent(
     name="image_handling_agent",
     model="gemini-2.0-flash-live-001",
@@ -27,5 +34,7 @@ image_agent = Agent(
     """,
     tools=[
         long_running_tool
-        ]
+        ],
+    before_tool_callback=[tag_before_tool, before_tool_callback],
+    after_tool_callback=[after_tool_callback, tag_after_tool],
 )
\ No newline at end of file
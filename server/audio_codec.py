@@ -0,0 +1,149 @@
+"""
+Outbound audio codecs for the model's 24kHz 16-bit mono PCM stream.
+
+The client advertises the codecs it can decode (`?audio_codecs=adpcm,ulaw,pcm`)
+when it opens the WebSocket. The server picks the first one it also supports and
+tags every outbound audio message with it, e.g.
+`{"mime_type": "audio/pcm", "codec": "adpcm", "data": "<base64>"}`.
+The matching decoders live in `pcm-player-processor.js`.
+
+Encoders are plain NumPy so they add no native dependency. mu-law is vectorised and
+cheap; IMA-ADPCM halves the bandwidth again but is a per-sample Python loop, so it is
+marked `blocking` and main.py runs it in a thread instead of on the event loop. The
+React client prefers mu-law and offers ADPCM as the CPU-heavy fallback.
+
+To add a codec, write a class with `name`, `blocking` and `encode(pcm_bytes) -> bytes`
+and register it in `CODECS`.
+"""
+from typing import Dict, Optional, Type
+
+import numpy as np
+
+SAMPLE_RATE = 24000
+DEFAULT_CODEC = "pcm"
+
+
+class PcmEncoder:
+    """Pass-through: raw little-endian int16 samples (1x)."""
+    name = "pcm"
+    blocking = False
+
+    def encode(self, pcm: bytes) -> bytes:
+        return pcm
+
+
+# --- G.711 mu-law (2x) ---
+_ULAW_BIAS = 0x84
+_ULAW_CLIP = 32635
+# Segment (exponent) lookup indexed by the biased magnitude >> 7.
+_ULAW_EXP_LUT = np.array(
+    [0, 0] + [e for e in range(1, 8) for _ in range(2 ** e)], dtype=np.int32
+)
+
+
+class MuLawEncoder:
+    """G.711 mu-law: one byte per sample (2x)."""
+    name = "ulaw"
+    blocking = False
+
+    def encode(self, pcm: bytes) -> bytes:
+        samples = np.frombuffer(pcm[: len(pcm) - len(pcm) % 2], dtype="<i2").astype(np.int32)
+        sign = (samples < 0).astype(np.int32) << 7
+        magnitude = np.minimum(np.abs(samples), _ULAW_CLIP) + _ULAW_BIAS
+        exponent = _ULAW_EXP_LUT[magnitude >> 7]
+        mantissa = (magnitude >> (exponent + 3)) & 0x0F
+        ulaw = ~(sign | (exponent << 4) | mantissa) & 0xFF
+        return ulaw.astype(np.uint8).tobytes()
+
+
+# --- IMA-ADPCM (4x) ---
+_IMA_INDEX_TABLE = [-1, -1, -1, -1, 2, 4, 6, 8, -1, -1, -1, -1, 2, 4, 6, 8]
+_IMA_STEP_TABLE = [
+    7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+    50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230,
+    253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963,
+    1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327,
+    3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442,
+    11487, 12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794,
+    32767,
+]
+
+
+class ImaAdpcmEncoder:
+    """
+    IMA-ADPCM: four bits per sample (4x).
+
+    Each encoded chunk is self-describing: a 4-byte header (int16 LE predictor,
+    uint8 step index, uint8 count of padding nibbles at the end) followed by
+    packed nibbles, low nibble first.
+    The encoder keeps its state across chunks so the stream is continuous, while the
+    header lets the player resync after it drops its buffer on an interruption.
+    """
+    name = "adpcm"
+    blocking = True # Too slow for the event loop; see the module docstring
+
+    def __init__(self):
+        self.predictor = 0
+        self.index = 0
+
+    def encode(self, pcm: bytes) -> bytes:
+        samples = np.frombuffer(pcm[: len(pcm) - len(pcm) % 2], dtype="<i2")
+        header = np.array([self.predictor], dtype="<i2").tobytes() + bytes([self.index, len(samples) & 1])
+
+        predictor = self.predictor
+        index = self.index
+        codes = np.zeros(len(samples) + (len(samples) & 1), dtype=np.uint8)
+        # The predictor depends on the previous sample, so this loop cannot be
+        # vectorised; plain ints keep it well under real time at 24kHz, but it
+        # still must not run on the event loop.
+        for i, sample in enumerate(samples.tolist()):
+            step = _IMA_STEP_TABLE[index]
+            diff = sample - predictor
+            code = 0
+            if diff < 0:
+                code = 8
+                diff = -diff
+            delta = step >> 3
+            if diff >= step:
+                code |= 4
+                diff -= step
+                delta += step
+            step >>= 1
+            if diff >= step:
+                code |= 2
+                diff -= step
+                delta += step
+            step >>= 1
+            if diff >= step:
+                code |= 1
+                delta += step
+            predictor = predictor - delta if code & 8 else predictor + delta
+            predictor = max(-32768, min(32767, predictor))
+            index = max(0, min(88, index + _IMA_INDEX_TABLE[code]))
+            codes[i] = code
+
+        self.predictor = predictor
+        self.index = index
+        packed = codes[0::2] | (codes[1::2] << 4)
+        return header + packed.tobytes()
+
+
+CODECS: Dict[str, Type] = {
+    PcmEncoder.name: PcmEncoder,
+    MuLawEncoder.name: MuLawEncoder,
+    ImaAdpcmEncoder.name: ImaAdpcmEncoder,
+}
+
+
+def negotiate_codec(offered: Optional[str]) -> str:
+    """Returns the first codec in the client's comma-separated preference list that we support."""
+    for name in (offered or "").split(","):
+        name = name.strip().lower()
+        if name in CODECS:
+            return name
+    return DEFAULT_CODEC
+
+
+def create_encoder(name: str):
+    """Returns a fresh (stateful) encoder instance for one session."""
+    return CODECS.get(name, CODECS[DEFAULT_CODEC])()
@@ -0,0 +1,121 @@
+"""
+Generated images: per-session folders, the SQLite manifest and retention.
+
+`create_image` saves into `assets/images/<session id>/<name>` and records the file in
+the `images` manifest of the shared state DB (owner session, size, SHA-256, creation and
+last access). Lookups (`/api/images/...`), gallery listings and the image poller read
+the manifest instead of the folder.
+
+A background task (`run_image_gc`, started by main.py) enforces the retention quotas:
+images not accessed for IMAGE_MAX_AGE_DAYS are deleted, then the least recently used
+ones until the folder is under IMAGE_MAX_TOTAL_MB. Its first pass also adopts files the
+manifest does not know (e.g. from before the manifest, in the flat folder) and drops
+entries whose file is gone.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import time
+from typing import Optional, Tuple
+
+from server import metrics
+from server.shared_state import delete_images, get_image, images_by_last_access, record_image
+
+IMAGES_DIR = "assets/images"
+IMAGE_MAX_AGE = float(os.getenv("IMAGE_MAX_AGE_DAYS", "30")) * 24 * 3600
+IMAGE_MAX_BYTES = int(float(os.getenv("IMAGE_MAX_TOTAL_MB", "1024")) * 1024 * 1024)
+IMAGE_GC_INTERVAL = float(os.getenv("IMAGE_GC_INTERVAL", "3600")) # seconds
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.-]")
+
+
+def _safe_component(value: str) -> str:
+    value = _UNSAFE.sub("_", os.path.basename(value or ""))
+    return value if value.strip(".") else "_"
+
+
+def image_relpath(session_id: str, name: str) -> str:
+    """Manifest key and URL path of a session's image: "<session id>/<name>"."""
+    return f"{_safe_component(session_id)}/{_safe_component(name)}"
+
+
+def image_file(relpath: str) -> str:
+    return os.path.join(IMAGES_DIR, *relpath.split("/"))
+
+
+def register_image(session_id: str, name: str) -> dict:
+    """Records a file just written to the session's folder in the manifest."""
+    relpath = image_relpath(session_id, name)
+    with open(image_file(relpath), "rb") as f:
+        data = f.read()
+    record_image(relpath, session_id, name, len(data), hashlib.sha256(data).hexdigest())
+    return get_image(relpath)
+
+
+def find_session_image(session_id: str, name: str) -> Optional[str]:
+    """The file of a session's image by name, falling back to an image in the old flat folder."""
+    entry = get_image(image_relpath(session_id, name)) or get_image(_safe_component(name))
+    return image_file(entry["path"]) if entry else None
+
+
+def _sync_manifest_with_disk() -> Tuple[int, int]:
+    """Adopts image files missing from the manifest and forgets entries without a file. Returns (added, dropped)."""
+    on_disk = set()
+    for directory, _, files in os.walk(IMAGES_DIR):
+        for filename in files:
+            relpath = os.path.relpath(os.path.join(directory, filename), IMAGES_DIR).replace(os.sep, "/")
+            on_disk.add(relpath)
+    known = {path for path, _, _ in images_by_last_access()}
+    added = 0
+    for relpath in sorted(on_disk - known):
+        session_id, _, name = relpath.rpartition("/") # Files in the flat folder belong to no session
+        path = image_file(relpath)
+        with open(path, "rb") as f:
+            data = f.read()
+        record_image(relpath, session_id, name, len(data), hashlib.sha256(data).hexdigest(), os.path.getmtime(path))
+        added += 1
+    missing = sorted(known - on_disk)
+    delete_images(missing)
+    return added, len(missing)
+
+
+def collect_image_garbage(max_age: float = IMAGE_MAX_AGE, max_bytes: int = IMAGE_MAX_BYTES) -> int:
+    """Deletes images unused for max_age seconds, then the least recently used ones over max_bytes. Returns the count."""
+    entries = images_by_last_access()
+    total = sum(size for _, size, _ in entries)
+    cutoff = time.time() - max_age
+    doomed = []
+    for path, size, last_access in entries:
+        if last_access >= cutoff and total <= max_bytes:
+            break
+        doomed.append(path)
+        total -= size
+    for path in doomed:
+        try:
+            os.remove(image_file(path))
+        except FileNotFoundError:
+            pass # Another worker got there first
+    delete_images(doomed)
+    metrics.set_gauge("images_stored_bytes", total)
+    if doomed:
+        metrics.increment("images_collected_total", len(doomed))
+        print(f"[IMAGE GC] Deleted {len(doomed)} images; {total / 1024 / 1024:.1f} MB left")
+    return len(doomed)
+
+
+async def run_image_gc(interval: float = IMAGE_GC_INTERVAL) -> None:
+    """Syncs the manifest with the folder once, then enforces the quotas every `interval` seconds."""
+    os.makedirs(IMAGES_DIR, exist_ok=True)
+    try:
+        added, dropped = await asyncio.to_thread(_sync_manifest_with_disk)
+        if added or dropped:
+            print(f"[IMAGE GC] Manifest synced with {IMAGES_DIR}: {added} files adopted, {dropped} stale entries dropped")
+    except Exception as e:
+        print(f"[IMAGE GC ERROR] Manifest sync failed: {e}")
+    while True:
+        try:
+            await asyncio.to_thread(collect_image_garbage)
+        except Exception as e:
+            print(f"[IMAGE GC ERROR] {e}")
+        await asyncio.sleep(interval)
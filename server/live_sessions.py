@@ -0,0 +1,188 @@
+"""
+Resumable live sessions.
+
+The ADK Runner, its LiveRequestQueue and the session's browser used to belong to one
+WebSocket and were torn down as soon as it dropped, so every network blip cost a cold
+restart. They now belong to a `LiveSession` that outlives its connections:
+
+- Each message to the client carries a sequence number (`seq`) and is kept in a bounded
+  `ReplayBuffer` (REPLAY_BUFFER_MESSAGES messages / REPLAY_BUFFER_BYTES bytes).
+- Each connection starts with `{"mime_type": "session/info", "resume_token": ..., "resumed": ...,
+  "base_seq": ...}`; the messages that follow are numbered after base_seq, so a client
+  that was not resumed (new run, seq from 1 again) resets its counter.
+- When the connection drops, the session stays alive for RESUME_GRACE_SECONDS and agent
+  output produced meanwhile is buffered. A reconnect to the same session id with the
+  token and the last `seq` it received takes over the running session and gets the
+  missed messages replayed. After the grace period the session is closed.
+
+Sessions live in the worker process that created them; a reconnect that lands on another
+worker starts a new run, with the conversation history from the session service.
+"""
+import asyncio
+import hmac
+import json
+import os
+import secrets
+from collections import deque
+from typing import Callable, Deque, Dict, List, Optional, Tuple
+
+from server.loop_monitor import tag_task
+
+RESUME_GRACE_SECONDS = float(os.getenv("RESUME_GRACE_SECONDS", "30"))
+REPLAY_BUFFER_MESSAGES = int(os.getenv("REPLAY_BUFFER_MESSAGES", "500"))
+REPLAY_BUFFER_BYTES = int(os.getenv("REPLAY_BUFFER_BYTES", str(8 * 1024 * 1024)))
+
+
+class ReplayBuffer:
+    """The most recent outbound messages, serialized, by sequence number."""
+
+    def __init__(self, max_messages: int = REPLAY_BUFFER_MESSAGES, max_bytes: int = REPLAY_BUFFER_BYTES):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self.last_seq = 0
+        self._messages: Deque[Tuple[int, str]] = deque()
+        self._bytes = 0
+
+    def add(self, message: dict) -> str:
+        """Numbers the message, keeps it and returns it as JSON."""
+        self.last_seq += 1
+        message["seq"] = self.last_seq
+        text = json.dumps(message)
+        self._messages.append((self.last_seq, text))
+        self._bytes += len(text)
+        while len(self._messages) > 1 and (len(self._messages) > self.max_messages or self._bytes > self.max_bytes):
+            self._bytes -= len(self._messages.popleft()[1])
+        return text
+
+    def since(self, seq: int) -> Optional[List[str]]:
+        """The messages after `seq`; None if some of them were already dropped."""
+        if seq >= self.last_seq:
+            return []
+        if not self._messages or self._messages[0][0] > seq + 1:
+            return None
+        return [text for message_seq, text in self._messages if message_seq > seq]
+
+
+class LiveSession:
+    def __init__(self, session_id: str, is_audio: bool, live_request_queue, on_close: Callable[[], None]):
+        self.session_id = session_id
+        self.is_audio = is_audio
+        self.live_request_queue = live_request_queue
+        self.resume_token = secrets.token_urlsafe(24)
+        self.replay = ReplayBuffer()
+        self.websocket = None # The current connection; None while waiting for a reconnect
+        self.agent_task: Optional[asyncio.Task] = None # Streams runner events to the client
+        self.closed = False
+        self._on_close = on_close
+        self._send_lock = asyncio.Lock() # Keeps seq order, and replays ahead of new messages
+        self._expiry: Optional[asyncio.Task] = None
+
+    def start(self, coroutine) -> None:
+        """Runs the agent-to-client stream. If it ends while no client is connected, the session closes."""
+        self.agent_task = asyncio.create_task(coroutine)
+        self.agent_task.add_done_callback(self._agent_task_done)
+        tag_task(self.agent_task, session=self.session_id)
+
+    def _agent_task_done(self, task: asyncio.Task) -> None:
+        if self.closed or self.websocket is not None:
+            return # The connection being served handles it
+        if not task.cancelled() and task.exception() is not None:
+            print(f"[LIVE SESSION] Run for {self.session_id} failed while detached: {task.exception()}")
+        asyncio.create_task(self.close())
+
+    def can_resume(self, resume_token: str, is_audio: bool) -> bool:
+        return (not self.closed and bool(resume_token) and is_audio == self.is_audio
+                and hmac.compare_digest(resume_token, self.resume_token))
+
+    async def send(self, message: dict) -> None:
+        """Sends a message to the client, or only buffers it while the client is away."""
+        async with self._send_lock:
+            text = self.replay.add(message)
+            websocket = self.websocket
+            if websocket is None:
+                return
+            try:
+                await websocket.send_text(text)
+            except Exception as e:
+                # The receive loop notices the drop too and detaches; the message stays buffered
+                print(f"[LIVE SESSION] Send to {self.session_id} failed, buffering until reconnect: {e}")
+                if self.websocket is websocket:
+                    self.websocket = None
+
+    async def attach(self, websocket, last_seq: Optional[int] = None) -> bool:
+        """
+        Makes `websocket` the session's connection and, for a reconnect, replays what the
+        client missed after `last_seq`. False if some missed messages were no longer buffered.
+        """
+        if self._expiry is not None:
+            self._expiry.cancel()
+            self._expiry = None
+        async with self._send_lock:
+            previous, self.websocket = self.websocket, websocket
+            if previous is not None and previous is not websocket:
+                try:
+                    await previous.close(code=1000, reason="Replaced by a newer connection")
+                except Exception:
+                    pass
+            resumed = last_seq is not None
+            await websocket.send_text(json.dumps({
+                "mime_type": "session/info",
+                "session_id": self.session_id,
+                "resume_token": self.resume_token,
+                "resumed": resumed,
+                # Messages on this connection are numbered after base_seq (0 for a new run)
+                "base_seq": min(last_seq, self.replay.last_seq) if resumed else self.replay.last_seq,
+            }))
+            if not resumed:
+                return True
+            missed = self.replay.since(last_seq)
+            for text in missed or []:
+                await websocket.send_text(text)
+            print(f"[LIVE SESSION] {self.session_id} resumed; replayed "
+                  f"{'incomplete' if missed is None else len(missed)} messages after seq {last_seq}")
+            return missed is not None
+
+    def detach(self, websocket) -> None:
+        """The connection dropped: keep the session for RESUME_GRACE_SECONDS unless a newer one took over."""
+        if self.closed or self.websocket not in (websocket, None) or self._expiry is not None:
+            return
+        self.websocket = None
+        print(f"[LIVE SESSION] {self.session_id} detached; kept for {RESUME_GRACE_SECONDS:g}s for a reconnect")
+        self._expiry = asyncio.create_task(self._expire())
+
+    async def _expire(self) -> None:
+        await asyncio.sleep(RESUME_GRACE_SECONDS)
+        print(f"[LIVE SESSION] {self.session_id} was not resumed within {RESUME_GRACE_SECONDS:g}s")
+        await self.close()
+
+    async def close(self, code: int = 1000, reason: str = "") -> None:
+        """Stops the run and releases the session's resources. Idempotent."""
+        if self.closed:
+            return
+        self.closed = True
+        if _sessions.get(self.session_id) is self:
+            del _sessions[self.session_id]
+        current = asyncio.current_task()
+        if self._expiry is not None and self._expiry is not current:
+            self._expiry.cancel()
+        if self.agent_task is not None and self.agent_task is not current:
+            self.agent_task.cancel()
+        self.live_request_queue.close()
+        websocket, self.websocket = self.websocket, None
+        if websocket is not None:
+            try:
+                await websocket.close(code=code, reason=reason)
+            except Exception:
+                pass
+        self._on_close()
+
+
+_sessions: Dict[str, LiveSession] = {}
+
+
+def get_live_session(session_id: str) -> Optional[LiveSession]:
+    return _sessions.get(session_id)
+
+
+def register_live_session(live: LiveSession) -> None:
+    _sessions[live.session_id] = live
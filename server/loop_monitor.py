@@ -0,0 +1,172 @@
+"""
+Event-loop lag monitor.
+
+Tools run synchronously on the event loop (Selenium calls, create_image's Gemini call), and
+so do file reads and the JSON/base64 encoding of screenshots; while any of them runs, no
+audio is streamed to anyone. This module measures how late the loop is and finds out who
+is holding it:
+
+- A heartbeat coroutine sleeps LOOP_MONITOR_INTERVAL_MS at a time and records how much
+  later than asked it woke up (`event_loop_lag_seconds`).
+- A watchdog thread notices when the heartbeat is overdue by LOOP_LAG_THRESHOLD_MS and
+  takes a stack sample of the event-loop thread while it is still blocked. The sample is
+  tagged with the session and tool of the asyncio task that is running (see `tag_task`;
+  tool calls are tagged by `tool_tagging_callbacks`).
+- When the loop comes back, the stall is counted (`event_loop_stalls_total{tool,site}`,
+  where site is the innermost project frame) and timed (`event_loop_stall_seconds{tool}`),
+  and the sample is kept for `/api/loop-stalls`.
+
+Set LOOP_MONITOR=0 to disable.
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import deque
+from typing import Dict, List, Optional
+
+from server import metrics
+from tools.session_context import get_session_id
+
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR", "1") != "0"
+LOOP_MONITOR_INTERVAL = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "50")) / 1000
+LOOP_LAG_THRESHOLD = float(os.getenv("LOOP_LAG_THRESHOLD_MS", "100")) / 1000
+STACK_DEPTH = 30
+RECENT_STALLS = 50
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _site(stack: traceback.StackSummary) -> str:
+    """The innermost frame in this project's code ("tools/browser_tool.py:browse_url"), else the innermost frame."""
+    for frame in reversed(stack):
+        path = os.path.abspath(frame.filename)
+        if path.startswith(_PROJECT_ROOT + os.sep) and "site-packages" not in path:
+            return f"{os.path.relpath(path, _PROJECT_ROOT)}:{frame.name}"
+    if not stack:
+        return "unknown"
+    return f"{os.path.basename(stack[-1].filename)}:{stack[-1].name}"
+
+
+class LoopMonitor:
+    def __init__(self, interval: float = LOOP_MONITOR_INTERVAL, threshold: float = LOOP_LAG_THRESHOLD):
+        self.interval = interval
+        self.threshold = threshold
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._last_beat = time.monotonic()
+        self._pending: Optional[Dict] = None # Sample of the stall in progress
+        self._sampled_beat = None
+        self._task_tags: "weakref.WeakKeyDictionary[asyncio.Task, Dict[str, str]]" = weakref.WeakKeyDictionary()
+        self._recent = deque(maxlen=RECENT_STALLS)
+
+    def start(self) -> None:
+        """Starts monitoring the running loop. Call from the loop thread."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stop.clear()
+        self._heartbeat_task = self._loop.create_task(self._heartbeat())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-monitor", daemon=True)
+        self._watchdog.start()
+        print(f"[LOOP MONITOR] Watching the event loop (sample stalls over {self.threshold * 1000:.0f}ms)")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+
+    def tag_task(self, task: Optional[asyncio.Task] = None, **tags: Optional[str]) -> None:
+        """Attributes stalls while `task` (default: the current task) runs to the given session / tool."""
+        task = task or asyncio.current_task()
+        if task is None:
+            return
+        current = dict(self._task_tags.get(task, {}))
+        current.update(tags)
+        self._task_tags[task] = current
+
+    def recent_stalls(self) -> List[Dict]:
+        with self._lock:
+            return list(self._recent)
+
+    async def _heartbeat(self) -> None:
+        while True:
+            start = time.monotonic()
+            self._last_beat = start
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - start - self.interval)
+            metrics.observe("event_loop_lag_seconds", lag)
+            if lag >= self.threshold:
+                self._finish_stall(lag)
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.interval / 2):
+            beat = self._last_beat
+            overdue = time.monotonic() - beat - self.interval
+            if overdue >= self.threshold and self._sampled_beat != beat:
+                self._sampled_beat = beat
+                self._sample(overdue)
+
+    def _sample(self, overdue: float) -> None:
+        """Runs on the watchdog thread while the loop is blocked."""
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return
+        stack = traceback.extract_stack(frame, limit=STACK_DEPTH)
+        task = asyncio.current_task(self._loop)
+        tags = self._task_tags.get(task, {}) if task is not None else {}
+        sample = {
+            "session": tags.get("session") or "-",
+            "tool": tags.get("tool") or ("-" if task is not None else "loop callback"),
+            "task": task.get_name() if task is not None else None,
+            "site": _site(stack),
+            "blocked_at_sample_ms": round(overdue * 1000, 1),
+            "stack": [f"{frame.filename}:{frame.lineno} in {frame.name}" for frame in stack],
+        }
+        with self._lock:
+            self._pending = sample
+
+    def _finish_stall(self, lag: float) -> None:
+        """Runs on the loop once it is responsive again."""
+        with self._lock:
+            sample, self._pending = self._pending, None
+        if sample is None:
+            # Over the threshold only by the time the loop woke up; nothing was sampled
+            sample = {"session": "-", "tool": "-", "task": None, "site": "unsampled", "stack": []}
+        sample["lag_ms"] = round(lag * 1000, 1)
+        sample["at"] = time.time()
+        metrics.increment("event_loop_stalls_total", tool=sample["tool"], site=sample["site"])
+        metrics.observe("event_loop_stall_seconds", lag, tool=sample["tool"])
+        with self._lock:
+            self._recent.append(sample)
+        print(f"[LOOP MONITOR] Event loop blocked for {lag * 1000:.0f}ms in session {sample['session']}, "
+              f"tool {sample['tool']}, at {sample['site']}")
+
+
+monitor = LoopMonitor()
+
+
+def tag_task(task: Optional[asyncio.Task] = None, **tags: Optional[str]) -> None:
+    monitor.tag_task(task, **tags)
+
+
+def tool_tagging_callbacks():
+    """ADK before/after tool callbacks that tag each tool call's task with its session and tool name."""
+
+    def before_tool_callback(tool, args, tool_context):
+        monitor.tag_task(session=get_session_id(), tool=tool.name)
+        return None
+
+    def after_tool_callback(tool, args, tool_context, tool_response):
+        monitor.tag_task(tool=None)
+        return None
+
+    return before_tool_callback, after_tool_callback
@@ -0,0 +1,82 @@
+"""
+In-process counters, gauges and latency histograms, served as JSON by `/api/metrics`.
+
+Metric names follow the Prometheus style (`webdriver_commands_total`), with labels
+folded into the key (`webdriver_commands_total{command="get"}`). Every uvicorn worker
+keeps its own numbers; the response includes the pid so scrapes can be told apart.
+"""
+import bisect
+import os
+import threading
+from typing import Dict, List
+
+# Upper bounds in seconds; the last bucket is +Inf.
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_gauges: Dict[str, float] = {}
+_histograms: Dict[str, "_Histogram"] = {}
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def to_dict(self) -> Dict:
+        cumulative, buckets = 0, {}
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            cumulative += count
+            buckets["+Inf" if bound == float("inf") else str(bound)] = cumulative
+        return {"count": self.count, "sum": round(self.sum, 6), "max": round(self.max, 6), "buckets": buckets}
+
+
+def _key(name: str, labels: Dict[str, str]) -> str:
+    if not labels:
+        return name
+    return name + "{" + ",".join(f'{k}="{v}"' for k, v in sorted(labels.items())) + "}"
+
+
+def increment(name: str, value: float = 1, **labels) -> None:
+    """Adds `value` to a counter."""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    """Sets a gauge (a value that goes up and down, e.g. slots in use)."""
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = value
+
+
+def observe(name: str, value: float, buckets=LATENCY_BUCKETS, **labels) -> None:
+    """Records one observation (seconds, by default) in a histogram."""
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = _Histogram(buckets)
+        histogram.observe(value)
+
+
+def snapshot() -> Dict:
+    """All metrics of this worker process."""
+    with _lock:
+        return {
+            "pid": os.getpid(),
+            "counters": dict(sorted(_counters.items())),
+            "gauges": dict(sorted(_gauges.items())),
+            "histograms": {key: histogram.to_dict() for key, histogram in sorted(_histograms.items())},
+        }
@@ -0,0 +1,251 @@
+"""
+Admission control for expensive resources: live sessions, Chrome instances, image
+generation jobs and vision calls.
+
+Each resource has a global budget and a per-user budget (a user is the client address a
+WebSocket came from; one user can open several sessions). A request over budget waits in
+a fair queue: a freed slot goes to the waiting user who holds the fewest slots of that
+resource, oldest request first. After `max_wait` seconds it is rejected instead: the
+WebSocket is closed with code 1013 (try again later), a tool call gets an error result
+without running.
+
+- "session": held while a WebSocket is connected (main.py).
+- "browser": a lease, taken by a session's first browser tool call and held until its
+  Chrome is closed (close_browser_session or disconnect).
+- "image" / "vision": held for one create_image / analyze_current_view_with_gemini call.
+
+Budgets come from GOVERNOR_<RESOURCE>_LIMIT, GOVERNOR_<RESOURCE>_PER_USER (0 = unlimited)
+and GOVERNOR_<RESOURCE>_MAX_WAIT / GOVERNOR_MAX_WAIT, and apply per uvicorn worker.
+Queue waits, admissions, rejections and slots in use go to `server.metrics`.
+"""
+import asyncio
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Dict, List
+
+from server import metrics
+from tools.session_context import get_session_id
+
+DEFAULT_MAX_WAIT = float(os.getenv("GOVERNOR_MAX_WAIT", "20"))
+
+
+@dataclass(frozen=True)
+class ResourceBudget:
+    limit: int # Slots across all users; 0 = unlimited
+    per_user: int # Slots one user may hold; 0 = unlimited
+    max_wait: float # Seconds a request may queue before it is rejected
+    lease: bool = False # One slot per session, held until released, instead of one per call
+
+
+def _budget(resource: str, limit: int, per_user: int, max_wait: float = DEFAULT_MAX_WAIT, lease: bool = False) -> ResourceBudget:
+    prefix = f"GOVERNOR_{resource.upper()}"
+    return ResourceBudget(
+        limit=int(os.getenv(f"{prefix}_LIMIT", str(limit))),
+        per_user=int(os.getenv(f"{prefix}_PER_USER", str(per_user))),
+        max_wait=float(os.getenv(f"{prefix}_MAX_WAIT", str(max_wait))),
+        lease=lease,
+    )
+
+
+BUDGETS = {
+    "session": _budget("session", limit=50, per_user=5, max_wait=10),
+    "browser": _budget("browser", limit=8, per_user=2, lease=True),
+    "image": _budget("image", limit=4, per_user=1),
+    "vision": _budget("vision", limit=8, per_user=2),
+}
+
+RESOURCE_LABELS = {
+    "session": "live sessions",
+    "browser": "browsers",
+    "image": "image generation",
+    "vision": "vision analysis",
+}
+
+
+class _Waiter:
+    __slots__ = ("session_id", "loop", "event", "granted")
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+        self.granted = False
+
+
+class ResourceGovernor:
+    def __init__(self, budgets: Dict[str, ResourceBudget]):
+        self.budgets = budgets
+        self._lock = threading.Lock() # Browser sessions are also closed from worker threads
+        self._users: Dict[str, str] = {} # session id -> user
+        self._held: Dict[str, Dict[str, int]] = {resource: {} for resource in budgets} # resource -> session id -> slots
+        self._waiters: Dict[str, List[_Waiter]] = {resource: [] for resource in budgets} # in arrival order
+
+    def register_session(self, session_id: str, user: str) -> None:
+        with self._lock:
+            self._users[session_id] = user
+
+    def holds(self, resource: str, session_id: str) -> int:
+        with self._lock:
+            return self._held[resource].get(session_id, 0)
+
+    def try_acquire(self, resource: str, session_id: str) -> bool:
+        """Takes a slot only if one is free right now; never waits. For sync code running on the event loop."""
+        with self._lock:
+            if self.budgets[resource].lease and self._held[resource].get(session_id):
+                return True
+            if not self._has_room(resource, self._user(session_id)):
+                metrics.increment("resource_requests_total", resource=resource, result="rejected")
+                return False
+            self._take(resource, session_id)
+            self._publish(resource)
+        metrics.increment("resource_requests_total", resource=resource, result="immediate")
+        return True
+
+    async def acquire(self, resource: str, session_id: str) -> bool:
+        """Takes a slot, queueing for up to the budget's max_wait. False if it was rejected."""
+        budget = self.budgets[resource]
+        with self._lock:
+            if budget.lease and self._held[resource].get(session_id):
+                return True
+            waiter = None
+            if self._has_room(resource, self._user(session_id)):
+                self._take(resource, session_id)
+            else:
+                waiter = _Waiter(session_id)
+                self._waiters[resource].append(waiter)
+            self._publish(resource)
+        if waiter is None:
+            metrics.increment("resource_requests_total", resource=resource, result="immediate")
+            return True
+
+        print(f"[GOVERNOR] No free {resource} slot; session {session_id} queued "
+              f"({len(self._waiters[resource])} waiting, max {budget.max_wait:g}s)")
+        start = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter.event.wait(), budget.max_wait)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    self._give_back(resource, session_id)
+                elif waiter in self._waiters[resource]:
+                    self._waiters[resource].remove(waiter)
+                self._dispatch(resource)
+            raise
+        with self._lock:
+            if not waiter.granted and waiter in self._waiters[resource]:
+                self._waiters[resource].remove(waiter)
+                self._publish(resource)
+        waited = time.monotonic() - start
+        metrics.observe("resource_queue_wait_seconds", waited, resource=resource)
+        result = "queued" if waiter.granted else "rejected"
+        metrics.increment("resource_requests_total", resource=resource, result=result)
+        print(f"[GOVERNOR] {resource} for session {session_id} {'granted' if waiter.granted else 'rejected'} after {waited:.1f}s in queue")
+        return waiter.granted
+
+    def release(self, resource: str, session_id: str) -> None:
+        with self._lock:
+            if self._held[resource].get(session_id):
+                self._give_back(resource, session_id)
+                self._dispatch(resource)
+
+    def release_session(self, session_id: str) -> None:
+        """Returns every slot the session holds and drops its queued requests (they are rejected)."""
+        with self._lock:
+            for resource in self.budgets:
+                self._held[resource].pop(session_id, None)
+                for waiter in [w for w in self._waiters[resource] if w.session_id == session_id]:
+                    self._waiters[resource].remove(waiter)
+                    waiter.loop.call_soon_threadsafe(waiter.event.set)
+                self._dispatch(resource)
+            self._users.pop(session_id, None)
+
+    # The helpers below are called with the lock held.
+
+    def _user(self, session_id: str) -> str:
+        return self._users.get(session_id, session_id)
+
+    def _user_slots(self, resource: str, user: str) -> int:
+        return sum(slots for session_id, slots in self._held[resource].items() if self._user(session_id) == user)
+
+    def _has_room(self, resource: str, user: str) -> bool:
+        budget = self.budgets[resource]
+        if budget.limit and sum(self._held[resource].values()) >= budget.limit:
+            return False
+        return not budget.per_user or self._user_slots(resource, user) < budget.per_user
+
+    def _take(self, resource: str, session_id: str) -> None:
+        held = self._held[resource]
+        held[session_id] = 1 if self.budgets[resource].lease else held.get(session_id, 0) + 1
+
+    def _give_back(self, resource: str, session_id: str) -> None:
+        held = self._held[resource]
+        held[session_id] = 0 if self.budgets[resource].lease else held.get(session_id, 0) - 1
+        if held[session_id] <= 0:
+            del held[session_id]
+
+    def _dispatch(self, resource: str) -> None:
+        """Hands free slots to queued requests: the user holding the fewest slots first, then the oldest request."""
+        waiters = self._waiters[resource]
+        while waiters:
+            if self.budgets[resource].lease:
+                # A session's parallel browser calls share its one lease
+                waiter = next((w for w in waiters if self._held[resource].get(w.session_id)), None)
+                if waiter is not None:
+                    self._grant(waiter, resource, take=False)
+                    continue
+            eligible = [w for w in waiters if self._has_room(resource, self._user(w.session_id))]
+            if not eligible:
+                break
+            self._grant(min(eligible, key=lambda w: self._user_slots(resource, self._user(w.session_id))), resource)
+        self._publish(resource)
+
+    def _grant(self, waiter: _Waiter, resource: str, take: bool = True) -> None:
+        self._waiters[resource].remove(waiter)
+        if take:
+            self._take(resource, waiter.session_id)
+        waiter.granted = True
+        waiter.loop.call_soon_threadsafe(waiter.event.set)
+
+    def _publish(self, resource: str) -> None:
+        metrics.set_gauge("resource_slots_in_use", sum(self._held[resource].values()), resource=resource)
+        metrics.set_gauge("resource_queue_length", len(self._waiters[resource]), resource=resource)
+
+
+governor = ResourceGovernor(BUDGETS)
+
+
+def busy_message(resource: str) -> str:
+    return (f"Error: the server is at capacity for {RESOURCE_LABELS[resource]} right now. "
+            f"Tell the user and try again in a minute, or continue without it.")
+
+
+def tool_admission_callbacks(tool_resources: Dict[str, str]):
+    """
+    ADK before/after tool callbacks that make the tools in `tool_resources` (tool name -> resource)
+    wait for a governor slot before running. Per-call slots are returned after the call; browser
+    leases stay with the session until its browser is closed.
+    """
+    admitted = set() # function call ids holding a per-call slot
+
+    async def before_tool_callback(tool, args, tool_context):
+        resource = tool_resources.get(tool.name)
+        if resource is None:
+            return None
+        if not await governor.acquire(resource, get_session_id()):
+            return {"result": busy_message(resource)}
+        if not governor.budgets[resource].lease:
+            admitted.add(tool_context.function_call_id)
+        return None
+
+    def after_tool_callback(tool, args, tool_context, tool_response):
+        resource = tool_resources.get(tool.name)
+        if resource is not None and tool_context.function_call_id in admitted:
+            admitted.discard(tool_context.function_call_id)
+            governor.release(resource, get_session_id())
+        return None
+
+    return before_tool_callback, after_tool_callback
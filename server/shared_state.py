@@ -0,0 +1,252 @@
+"""
+State shared by every uvicorn worker on the host.
+
+Each worker is a separate process, so anything that must be visible across
+workers lives in one SQLite file (WAL mode; safe for concurrent readers and
+writers on a single host) instead of module globals:
+
+- `browser_leases`: which worker process owns the Chrome instance for a session.
+- `image_events`: "image generated for session X" notifications, so the worker
+  holding that session's WebSocket picks them up no matter which process wrote them.
+- `fetch_routes`: per host and path prefix "plain HTTP is enough" / "needs a browser"
+  decisions learned by `tools/adaptive_fetch.py`; persistent, so they survive restarts.
+- `images`: manifest of generated images (owner session, size, hash, creation and last
+  access), so lookups and gallery listings never scan `assets/images`; see `server/image_store.py`.
+
+Point `SHARED_STATE_DB` at a shared path when running `uvicorn main:app --workers N`.
+"""
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import List, Optional, Tuple
+
+SHARED_STATE_DB = os.getenv("SHARED_STATE_DB", "assets/shared_state.sqlite3")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS browser_leases (
+    session_id TEXT PRIMARY KEY,
+    pid INTEGER NOT NULL,
+    hostname TEXT NOT NULL,
+    acquired_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS image_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session_id TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    delivered INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_image_events_pending ON image_events (session_id, delivered, id);
+CREATE TABLE IF NOT EXISTS fetch_routes (
+    host TEXT PRIMARY KEY, -- host and path prefix, e.g. "example.com/app/"
+    route TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    escalations INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS images (
+    path TEXT PRIMARY KEY,
+    session_id TEXT NOT NULL,
+    name TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_images_session ON images (session_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_images_last_access ON images (last_access);
+"""
+IMAGE_ACCESS_RESOLUTION = 60 # seconds; last_access is not rewritten more often than this
+FETCH_ROUTE_TTL = float(os.getenv("FETCH_ROUTE_TTL", str(24 * 3600))) # Re-probe after a day
+# Escalations in a row before a prefix skips the HTTP attempt; one odd page must not pin it
+FETCH_ROUTE_MIN_ESCALATIONS = int(os.getenv("FETCH_ROUTE_MIN_ESCALATIONS", "3"))
+
+_local = threading.local()
+
+
+def _connect() -> sqlite3.Connection:
+    """Returns this thread's connection, creating the database and schema on first use."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        directory = os.path.dirname(SHARED_STATE_DB)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(SHARED_STATE_DB, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(_SCHEMA)
+        _migrate(conn)
+        _local.conn = conn
+    return conn
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    """Adds columns introduced after a table was first created."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(fetch_routes)")}
+    if "escalations" not in columns:
+        try:
+            conn.execute("ALTER TABLE fetch_routes ADD COLUMN escalations INTEGER NOT NULL DEFAULT 0")
+        except sqlite3.OperationalError:
+            pass # Another worker added it first
+
+
+# --- Browser ownership ---
+
+def claim_browser(session_id: str) -> bool:
+    """Records this process as the owner of the session's browser. False if another live process owns it."""
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE") # Two workers must not both see no owner and both claim
+    try:
+        owner = browser_owner(session_id)
+        if owner and owner != (os.getpid(), socket.gethostname()) and _owner_alive(*owner):
+            conn.execute("COMMIT")
+            return False
+        conn.execute(
+            "INSERT OR REPLACE INTO browser_leases (session_id, pid, hostname, acquired_at) VALUES (?, ?, ?, ?)",
+            (session_id, os.getpid(), socket.gethostname(), time.time()),
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return True
+
+
+def release_browser(session_id: str) -> None:
+    """Drops the lease if this process holds it."""
+    _connect().execute(
+        "DELETE FROM browser_leases WHERE session_id = ? AND pid = ? AND hostname = ?",
+        (session_id, os.getpid(), socket.gethostname()),
+    )
+
+
+def browser_owner(session_id: str) -> Optional[Tuple[int, str]]:
+    """Returns (pid, hostname) of the process owning the session's browser, if any."""
+    row = _connect().execute(
+        "SELECT pid, hostname FROM browser_leases WHERE session_id = ?", (session_id,)
+    ).fetchone()
+    return (row[0], row[1]) if row else None
+
+
+def _owner_alive(pid: int, hostname: str) -> bool:
+    """A lease left behind by a crashed worker on this host should not block the session forever."""
+    if hostname != socket.gethostname():
+        return True
+    try:
+        os.kill(pid, 0)
+        return True
+    except OSError:
+        return False
+
+
+# --- Generated image notifications ---
+
+def publish_image_event(session_id: str, filename: str) -> None:
+    """Announces a newly generated image to whichever worker serves the session."""
+    _connect().execute(
+        "INSERT INTO image_events (session_id, filename, created_at) VALUES (?, ?, ?)",
+        (session_id, filename, time.time()),
+    )
+    print(f"[SHARED_STATE]: Published image event for session {session_id}: {filename}")
+
+
+def claim_image_event(session_id: str) -> Optional[str]:
+    """Atomically takes the oldest undelivered image for the session. Returns its filename or None."""
+    conn = _connect()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT id, filename FROM image_events WHERE session_id = ? AND delivered = 0 ORDER BY id LIMIT 1",
+            (session_id,),
+        ).fetchone()
+        if row:
+            conn.execute("UPDATE image_events SET delivered = 1 WHERE id = ?", (row[0],))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return row[1] if row else None
+
+
+# --- Adaptive fetch routing ---
+
+def get_fetch_route(prefix: str) -> Optional[str]:
+    """
+    Returns the learned route ("http" or "browser") for a host and path prefix, unless it is
+    older than FETCH_ROUTE_TTL. "browser" only after FETCH_ROUTE_MIN_ESCALATIONS in a row.
+    """
+    row = _connect().execute(
+        "SELECT route, escalations FROM fetch_routes WHERE host = ? AND updated_at > ?",
+        (prefix, time.time() - FETCH_ROUTE_TTL),
+    ).fetchone()
+    if not row or (row[0] == "browser" and row[1] < FETCH_ROUTE_MIN_ESCALATIONS):
+        return None
+    return row[0]
+
+
+def record_fetch_route(prefix: str, route: str, reason: str) -> None:
+    """Remembers how a page under the prefix had to be fetched; escalations count up, an HTTP success resets them."""
+    now = time.time()
+    _connect().execute(
+        """
+        INSERT INTO fetch_routes (host, route, reason, updated_at, escalations) VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT(host) DO UPDATE SET
+            route = excluded.route, reason = excluded.reason, updated_at = excluded.updated_at,
+            escalations = CASE WHEN excluded.route = 'browser' AND fetch_routes.route = 'browser'
+                               AND fetch_routes.updated_at > ? THEN fetch_routes.escalations + 1
+                               ELSE excluded.escalations END
+        """,
+        (prefix, route, reason, now, 1 if route == "browser" else 0, now - FETCH_ROUTE_TTL),
+    )
+
+
+# --- Generated image manifest ---
+
+_IMAGE_COLUMNS = "path, session_id, name, size, sha256, created_at, last_access"
+
+
+def _image_row(row) -> Optional[dict]:
+    return dict(zip(_IMAGE_COLUMNS.split(", "), row)) if row else None
+
+
+def record_image(path: str, session_id: str, name: str, size: int, sha256: str, created_at: Optional[float] = None) -> None:
+    """Adds or replaces the manifest entry of an image file (path relative to the images folder)."""
+    now = time.time()
+    _connect().execute(
+        f"INSERT OR REPLACE INTO images ({_IMAGE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (path, session_id, name, size, sha256, created_at or now, now),
+    )
+
+
+def get_image(path: str, touch: bool = False) -> Optional[dict]:
+    """The manifest entry for the path; with touch=True its last access is updated too."""
+    conn = _connect()
+    if touch:
+        now = time.time()
+        conn.execute(
+            "UPDATE images SET last_access = ? WHERE path = ? AND last_access < ?",
+            (now, path, now - IMAGE_ACCESS_RESOLUTION),
+        )
+    return _image_row(conn.execute(f"SELECT {_IMAGE_COLUMNS} FROM images WHERE path = ?", (path,)).fetchone())
+
+
+def list_images(session_id: Optional[str] = None) -> List[dict]:
+    """The session's images (or all images), newest first."""
+    if session_id is None:
+        rows = _connect().execute(f"SELECT {_IMAGE_COLUMNS} FROM images ORDER BY created_at DESC").fetchall()
+    else:
+        rows = _connect().execute(
+            f"SELECT {_IMAGE_COLUMNS} FROM images WHERE session_id = ? ORDER BY created_at DESC", (session_id,)
+        ).fetchall()
+    return [_image_row(row) for row in rows]
+
+
+def images_by_last_access() -> List[Tuple[str, int, float]]:
+    """(path, size, last_access) of every image, least recently used first."""
+    return _connect().execute("SELECT path, size, last_access FROM images ORDER BY last_access").fetchall()
+
+
+def delete_images(paths: List[str]) -> None:
+    _connect().executemany("DELETE FROM images WHERE path = ?", [(path,) for path in paths])
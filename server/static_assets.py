@@ -0,0 +1,123 @@
+"""
+In-memory, precompressed serving of the React build (`frontend/build`).
+
+At startup every file in the build is read once and, if it is a compressible type,
+gzip- and (when the optional `brotli` package is installed) brotli-compressed at
+maximum level. Requests are then answered from memory, picking the best encoding
+from `Accept-Encoding`:
+
+- Content-hashed bundles (`main.3f2a1b9c.js`, `787.28cb0dcd.chunk.js`, ...) get
+  `Cache-Control: public, max-age=31536000, immutable`.
+- Everything else (index.html, the audio worklets, manifest.json) gets `no-cache`
+  plus a strong ETag, so browsers revalidate with a cheap 304.
+"""
+import gzip
+import hashlib
+import mimetypes
+import re
+from pathlib import Path
+from typing import Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+
+try:
+    import brotli
+except ImportError:  # optional dependency; gzip only without it
+    brotli = None
+
+COMPRESSIBLE_SUFFIXES = {".js", ".css", ".html", ".json", ".svg", ".map", ".txt", ".ico", ".webmanifest"}
+MIN_COMPRESS_SIZE = 1024
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+_HASHED_NAME = re.compile(r"\.[0-9a-f]{8,}(\.chunk)?\.[a-z0-9]+$")
+
+
+class _Asset:
+    """One build file with its precomputed encodings, keyed by content-coding ("identity", "gzip", "br")."""
+
+    def __init__(self, path: Path, data: bytes):
+        self.path = path
+        self.media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        if path.suffix == ".js":
+            self.media_type = "application/javascript"
+        self.etag = hashlib.sha1(data).hexdigest()[:20]
+        self.immutable = bool(_HASHED_NAME.search(path.name))
+        self.encodings: Dict[str, bytes] = {"identity": data}
+        if path.suffix in COMPRESSIBLE_SUFFIXES and len(data) >= MIN_COMPRESS_SIZE:
+            gzipped = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(gzipped) < len(data):
+                self.encodings["gzip"] = gzipped
+            if brotli is not None:
+                brotlied = brotli.compress(data, quality=11)
+                if len(brotlied) < len(data):
+                    self.encodings["br"] = brotlied
+
+
+def _accepted_encodings(accept_encoding: str) -> set:
+    accepted = set()
+    for token in accept_encoding.split(","):
+        name, _, params = token.strip().partition(";")
+        quality = params.replace(" ", "")
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                pass
+        accepted.add(name.strip().lower())
+    return accepted
+
+
+class PrecompressedAssets:
+    """Serves files under `root` from memory; falls back to disk until `build()` has run."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self._assets: Dict[str, _Asset] = {}
+        self.built = False
+
+    def build(self) -> None:
+        """Reads and compresses the whole build. Blocking; run it off the event loop."""
+        assets = {}
+        raw_total = 0
+        best_total = 0
+        for path in sorted(self.root.rglob("*")):
+            if not path.is_file():
+                continue
+            asset = _Asset(path, path.read_bytes())
+            assets[path.relative_to(self.root).as_posix()] = asset
+            raw_total += len(asset.encodings["identity"])
+            best_total += min(len(body) for body in asset.encodings.values())
+        self._assets = assets
+        self.built = True
+        print(f"[STATIC]: Precompressed {len(assets)} files from {self.root} "
+              f"({raw_total / 1024:.0f} KiB -> {best_total / 1024:.0f} KiB, brotli: {brotli is not None})")
+
+    def response(self, relative_path: str, request: Request, media_type: Optional[str] = None) -> Optional[Response]:
+        """Returns the response for a build file, or None if there is no such file."""
+        asset = self._assets.get(relative_path)
+        if asset is None:
+            if self.built:
+                return None
+            # Not precompressed yet (startup still running): serve straight from disk.
+            path = (self.root / relative_path).resolve()
+            if self.root.resolve() not in path.parents or not path.is_file():
+                return None
+            return FileResponse(path, media_type=media_type)
+
+        accepted = _accepted_encodings(request.headers.get("accept-encoding", ""))
+        encoding = next((name for name in ("br", "gzip") if name in asset.encodings and name in accepted), "identity")
+        etag = f'"{asset.etag}"' if encoding == "identity" else f'"{asset.etag}-{encoding}"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if asset.immutable else REVALIDATE_CACHE_CONTROL,
+            "Vary": "Accept-Encoding",
+        }
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+
+        if_none_match = request.headers.get("if-none-match", "")
+        if etag in [tag.strip() for tag in if_none_match.split(",")] or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
+        return Response(asset.encodings[encoding], media_type=media_type or asset.media_type, headers=headers)
@@ -2,6 +2,17 @@
  * An audio worklet processor that stores the PCM audio data sent from the main thread
  * to a buffer and plays it.
  */
+const IMA_INDEX_TABLE = [-1, -1, -1, -1, 2, 4, 6, 8, -1, -1, -1, -1, 2, 4, 6, 8];
+const IMA_STEP_TABLE = [
+  7, 8, 9, 10, 11, 12, 13, 14, 16, 17, 19, 21, 23, 25, 28, 31, 34, 37, 41, 45,
+  50, 55, 60, 66, 73, 80, 88, 97, 107, 118, 130, 143, 157, 173, 190, 209, 230,
+  253, 279, 307, 337, 371, 408, 449, 494, 544, 598, 658, 724, 796, 876, 963,
+  1060, 1166, 1282, 1411, 1552, 1707, 1878, 2066, 2272, 2499, 2749, 3024, 3327,
+  3660, 4026, 4428, 4871, 5358, 5894, 6484, 7132, 7845, 8630, 9493, 10442,
+  11487, 12635, 13899, 15289, 16818, 18500, 20350, 22385, 24623, 27086, 29794,
+  32767,
+];
+
 class PCMPlayerProcessor extends AudioWorkletProcessor {
     constructor() {
       super();
@@ -21,13 +32,64 @@ class PCMPlayerProcessor extends AudioWorkletProcessor {
           return;
         }
   
-        // Decode the base64 data to int16 array.
-        const int16Samples = new Int16Array(event.data);
+        // Messages are either a raw PCM ArrayBuffer or { codec, data } for a
+        // negotiated codec (see server/audio_codec.py).
+        const codec = event.data.codec || 'pcm';
+        const payload = event.data.codec ? event.data.data : event.data;
+        const int16Samples = this._decode(codec, payload);
   
         // Add the audio data to the buffer
         this._enqueue(int16Samples);
       };
     }
+
+    _decode(codec, buffer) {
+      if (codec === 'ulaw') {
+        return PCMPlayerProcessor.decodeMuLaw(new Uint8Array(buffer));
+      }
+      if (codec === 'adpcm') {
+        return PCMPlayerProcessor.decodeImaAdpcm(buffer);
+      }
+      return new Int16Array(buffer);
+    }
+
+    // G.711 mu-law: one byte per sample.
+    static decodeMuLaw(bytes) {
+      const out = new Int16Array(bytes.length);
+      for (let i = 0; i < bytes.length; i++) {
+        const u = ~bytes[i] & 0xff;
+        const exponent = (u >> 4) & 0x07;
+        const mantissa = u & 0x0f;
+        const magnitude = (((mantissa << 3) + 0x84) << exponent) - 0x84;
+        out[i] = (u & 0x80) ? -magnitude : magnitude;
+      }
+      return out;
+    }
+
+    // IMA-ADPCM chunk: int16 predictor, uint8 step index, uint8 padding nibbles, then
+    // packed nibbles (low nibble first).
+    static decodeImaAdpcm(buffer) {
+      const view = new DataView(buffer);
+      let predictor = view.getInt16(0, true);
+      let index = view.getUint8(2);
+      const padding = view.getUint8(3);
+      const bytes = new Uint8Array(buffer, 4);
+      const count = bytes.length * 2 - padding;
+      const out = new Int16Array(count);
+      for (let i = 0; i < count; i++) {
+        const code = (i & 1) ? (bytes[i >> 1] >> 4) : (bytes[i >> 1] & 0x0f);
+        const step = IMA_STEP_TABLE[index];
+        let delta = step >> 3;
+        if (code & 4) delta += step;
+        if (code & 2) delta += step >> 1;
+        if (code & 1) delta += step >> 2;
+        predictor += (code & 8) ? -delta : delta;
+        predictor = Math.max(-32768, Math.min(32767, predictor));
+        index = Math.max(0, Math.min(88, index + IMA_INDEX_TABLE[code]));
+        out[i] = predictor;
+      }
+      return out;
+    }
   
     // Push incoming Int16 data into our ring buffer.
     _enqueue(int16Samples) {
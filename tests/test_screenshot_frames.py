@@ -0,0 +1,60 @@
+import asyncio
+from io import BytesIO
+
+from PIL import Image, ImageDraw
+
+from tools import browser_tool
+from tools.screenshot_encoder import render_frame
+
+
+def _png(color, box=None) -> bytes:
+    image = Image.new("RGB", (1280, 720), "white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((100, 100, 1180, 620), fill=color)
+    if box:
+        draw.rectangle(box, fill="black")
+    out = BytesIO()
+    image.save(out, format="PNG")
+    return out.getvalue()
+
+
+def _render_pending(session_id):
+    async def render_all():
+        return [await render_frame(*capture) for capture in browser_tool.pop_screenshot_captures(session_id)]
+    return asyncio.run(render_all())
+
+
+def _session(session_id):
+    state = browser_tool._BrowserSession()
+    browser_tool._browser_sessions[session_id] = state
+    return state
+
+
+def test_capture_tuple_renders_full_then_delta():
+    state = _session("frames-single")
+    try:
+        state.pending_captures.append(_png("steelblue"))
+        [first] = _render_pending("frames-single")
+        assert first["type"] == "full"
+        assert first["mime_type"] == state.profile.mime_type
+
+        state.pending_captures.append(_png("steelblue", box=(200, 200, 260, 240)))
+        [second] = _render_pending("frames-single")
+        assert second["type"] == "delta"
+        assert second["base_frame_id"] == first["frame_id"]
+        assert second["tiles"]
+    finally:
+        browser_tool._browser_sessions.pop("frames-single", None)
+
+
+def test_multi_tab_capture_gives_one_frame_per_tab():
+    state = _session("frames-tabs")
+    try:
+        # browse_urls(..., screenshots=True) queues one capture per tab
+        state.pending_captures.extend([_png("steelblue"), _png("darkorange"), _png("seagreen")])
+        frames = _render_pending("frames-tabs")
+        assert [frame["type"] for frame in frames] == ["full", "full", "full"]
+        assert [frame["frame_id"] for frame in frames] == [1, 2, 3]
+        assert not state.pending_captures
+    finally:
+        browser_tool._browser_sessions.pop("frames-tabs", None)
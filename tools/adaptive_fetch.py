@@ -0,0 +1,132 @@
+"""
+One fetch tool that routes between plain HTTP and the session's Chrome.
+
+`fetch_page` first tries the pooled HTTP client (`tools/crawl_url.py`). If the HTML
+looks like it only renders with JavaScript (almost no text, an empty app root such as
+`<div id="root"></div>`, a "please enable JavaScript" noscript hint, or a bot challenge
+page) it escalates to the browser with the fast browsing profile. The decision is
+remembered per host and first path segment ("example.com/app/") in the shared state DB
+(`fetch_routes`). A prefix skips the HTTP attempt only after FETCH_ROUTE_MIN_ESCALATIONS
+escalations in a row, so one script-heavy page does not send a whole site to Chrome.
+"""
+import re
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
+from server import metrics
+from server.shared_state import get_fetch_route, record_fetch_route
+from tools.browser_tool import render_page_markdown
+from tools.crawl_url import HTTP_TIMEOUT, can_crawl, http_session
+from tools.driver_proxy import track_webdriver_calls
+from tools.page_store import format_section, store_page
+
+MIN_TEXT_CHARS = 400 # Pages with less visible text are checked for signs of client-side rendering
+# With no such sign, only a page with scripts and next to no text is treated as client-rendered;
+# small static pages (a short notice plus an analytics snippet) stay on plain HTTP.
+SCRIPT_ONLY_TEXT_CHARS = 40
+
+_INVISIBLE = re.compile(r"<(script|style|noscript|template|svg|head)\b[^>]*>.*?</\1\s*>", re.I | re.S)
+_TAGS = re.compile(r"<[^>]+>")
+_EMPTY_APP_ROOT = re.compile(
+    r"<(div|main|app-root)\b[^>]*\bid=[\"']?(root|app|__next|__nuxt|svelte|main-app)[\"']?[^>]*>\s*</\1>", re.I
+)
+_NOSCRIPT = re.compile(r"<noscript\b[^>]*>(.*?)</noscript\s*>", re.I | re.S)
+_JS_REQUIRED = re.compile(
+    r"(enable|turn on|requires?|need)\s+(to\s+enable\s+)?javascript|javascript\s+(is\s+)?(disabled|required|must be enabled)",
+    re.I,
+)
+_CHALLENGE_MARKERS = ("challenge-platform", "cf-browser-verification", "_cf_chl_opt", "<title>Just a moment...</title>")
+
+
+def needs_browser(status_code: int, content_type: str, html: str) -> Optional[str]:
+    """Returns why an HTTP response has to be rendered in a browser, or None if its HTML is usable as is."""
+    if status_code in (403, 429, 503) and any(marker in html for marker in _CHALLENGE_MARKERS):
+        return "bot challenge page"
+    if "html" not in content_type:
+        return None
+    visible_text = " ".join(_TAGS.sub(" ", _INVISIBLE.sub(" ", html)).split())
+    if len(visible_text) >= MIN_TEXT_CHARS:
+        return None
+    if _EMPTY_APP_ROOT.search(html):
+        return "empty app root"
+    if any(_JS_REQUIRED.search(noscript) for noscript in _NOSCRIPT.findall(html)):
+        return "noscript asks for JavaScript"
+    if _JS_REQUIRED.search(visible_text):
+        return "page asks for JavaScript"
+    if len(visible_text) < SCRIPT_ONLY_TEXT_CHARS and "<script" in html.lower():
+        return f"only {len(visible_text)} characters of text"
+    return None
+
+
+@track_webdriver_calls
+def fetch_page(url: str) -> str:
+    """
+    Fetches a page and returns the first part of its content as markdown, using a fast plain HTTP
+    request when possible and a real browser only for pages that need JavaScript. Prefer this over
+    load_page and browse_url for reading pages; it does not show a screenshot. Long pages end with a
+    cursor for read_page_section.
+    """
+    if not can_crawl(url):
+        return f"URL {url} is not crawlable."
+    start = time.perf_counter()
+    prefix = route_prefix(url)
+    learned_route = get_fetch_route(prefix)
+    reason = f"pages under {prefix} known to need a browser"
+    response = None
+
+    if learned_route != "browser":
+        try:
+            response, why = _get_over_http(url)
+        except Exception as e:
+            reason = f"HTTP request failed: {e}"
+        else:
+            if why is None:
+                if learned_route != "http":
+                    record_fetch_route(prefix, "http", "static HTML")
+                return _http_output(url, response, start, "plain HTTP")
+            reason = why
+            record_fetch_route(prefix, "browser", reason)
+            print(f"[FETCH] {url} needs a browser: {reason}")
+
+    try:
+        final_url, page_markdown = render_page_markdown(url, fast=True)
+    except Exception as e:
+        if response is None and learned_route == "browser":
+            try:
+                response, _ = _get_over_http(url)
+            except Exception:
+                pass
+        if response is not None:
+            # No browser available right now; the plain HTTP response is better than nothing
+            print(f"[FETCH] Browser fallback for {url} failed, returning the HTTP response: {e}")
+            return _http_output(url, response, start, f"plain HTTP, browser unavailable; may be incomplete: {reason}")
+        metrics.increment("adaptive_fetch_errors_total")
+        return f"Error fetching {url}: {reason}; browser fallback failed: {e}"
+    metrics.increment("adaptive_fetch_total", route="browser")
+    metrics.observe("adaptive_fetch_seconds", time.perf_counter() - start, route="browser")
+    page = store_page(page_markdown, url, final_url)
+    return f"Fetched {final_url} (browser, {reason}). Page content (markdown):\n{format_section(page)}"
+
+
+def route_prefix(url: str) -> str:
+    """Host plus the first path segment if the path goes deeper: "example.com/app/", else "example.com/"."""
+    parsed = urlparse(url)
+    segments = parsed.path.strip("/").split("/")
+    first = segments[0] if len(segments) > 1 else ""
+    return f"{(parsed.hostname or '').lower()}/{first + '/' if first else ''}"
+
+
+def _get_over_http(url: str):
+    """Fetches the URL with the pooled HTTP client. Returns (response, why it needs a browser or None)."""
+    response = http_session().get(url, timeout=HTTP_TIMEOUT)
+    return response, needs_browser(response.status_code, response.headers.get("Content-Type", ""), response.text)
+
+
+def _http_output(url: str, response, start: float, note: str) -> str:
+    """Stores an HTTP response's page and returns the tool output for it."""
+    import markdownify
+    metrics.increment("adaptive_fetch_total", route="http")
+    metrics.observe("adaptive_fetch_seconds", time.perf_counter() - start, route="http")
+    page = store_page(markdownify.markdownify(response.text), url, response.url)
+    return f"Fetched {response.url} ({note}). Page content (markdown):\n{format_section(page)}"
@@ -0,0 +1,77 @@
+"""
+Browsing profiles for the per-session Chrome.
+
+- "full": what the user sees. Every resource loads and navigation waits for the `load`
+  event, so screenshots and vision analysis show the real page.
+- "fast": for text extraction. Images, media, fonts and known ad/tracker domains are
+  blocked through CDP `Network.setBlockedURLs`, navigation returns at DOMContentLoaded
+  ("eager") and the viewport is smaller.
+
+Chrome itself is always launched with the eager page-load strategy; a "normal" profile
+then waits for `document.readyState == "complete"` after navigating. That way one
+session's browser can switch profiles per call without a relaunch.
+"""
+import os
+from dataclasses import dataclass
+from typing import Dict, Tuple
+
+# Resource types that cost bandwidth and decode time but add nothing to the page text.
+HEAVY_RESOURCE_PATTERNS = (
+    "*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.avif", "*.svg", "*.ico", "*.bmp",
+    "*.woff", "*.woff2", "*.ttf", "*.otf", "*.eot",
+    "*.mp4", "*.webm", "*.ogg", "*.mp3", "*.wav", "*.m4a", "*.m3u8",
+)
+
+# Ad, analytics and tag-manager hosts; blocking them also avoids their follow-up requests.
+TRACKER_PATTERNS = (
+    "*doubleclick.net*", "*googlesyndication.com*", "*googleadservices.com*", "*adservice.google.*",
+    "*google-analytics.com*", "*googletagmanager.com*", "*googletagservices.com*",
+    "*facebook.net*", "*connect.facebook.com*", "*scorecardresearch.com*", "*quantserve.com*",
+    "*hotjar.com*", "*segment.io*", "*cdn.segment.com*", "*amazon-adsystem.com*", "*adnxs.com*",
+    "*criteo.com*", "*taboola.com*", "*outbrain.com*", "*chartbeat.com*", "*newrelic.com*",
+)
+
+
+def _viewport_from_env(name: str, default: str) -> Tuple[int, int]:
+    width, _, height = os.getenv(name, default).lower().partition("x")
+    try:
+        return int(width), int(height)
+    except ValueError:
+        print(f"[WebDriver] Ignoring invalid {name}={os.getenv(name)!r}, using {default}")
+        width, _, height = default.partition("x")
+        return int(width), int(height)
+
+
+@dataclass(frozen=True)
+class BrowsingProfile:
+    """How a page is loaded: which URLs are blocked, when navigation returns, and the window size."""
+    name: str
+    blocked_url_patterns: Tuple[str, ...]
+    page_load_strategy: str # "normal" (wait for load) or "eager" (DOMContentLoaded)
+    viewport: Tuple[int, int]
+
+    @property
+    def blocks_resources(self) -> bool:
+        return bool(self.blocked_url_patterns)
+
+
+BROWSING_PROFILES: Dict[str, BrowsingProfile] = {
+    "full": BrowsingProfile(
+        name="full",
+        blocked_url_patterns=(),
+        page_load_strategy="normal",
+        viewport=_viewport_from_env("BROWSER_VIEWPORT", "1920x1080"),
+    ),
+    "fast": BrowsingProfile(
+        name="fast",
+        blocked_url_patterns=HEAVY_RESOURCE_PATTERNS + TRACKER_PATTERNS,
+        page_load_strategy=os.getenv("FAST_BROWSE_PAGE_LOAD_STRATEGY", "eager"),
+        viewport=_viewport_from_env("FAST_BROWSE_VIEWPORT", "1280x800"),
+    ),
+}
+DEFAULT_BROWSING_PROFILE = "full"
+
+
+def get_browsing_profile(name: str) -> BrowsingProfile:
+    """Returns the named browsing profile, falling back to full fidelity for unknown names."""
+    return BROWSING_PROFILES.get((name or "").lower(), BROWSING_PROFILES[DEFAULT_BROWSING_PROFILE])
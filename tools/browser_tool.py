@@ -1,75 +1,294 @@
-import requests
+# Selenium 4 loads its browser-specific modules lazily, so these imports are cheap.
+# webdriver_manager, markdownify and google.genai are imported where they are used,
+# which keeps importing the agent (and therefore main.py) fast.
 from selenium import webdriver
 from selenium.webdriver.common.by import By
-from selenium.webdriver.remote.webelement import WebElement
 from selenium.common.exceptions import NoSuchElementException, TimeoutException
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.chrome.service import Service as ChromeService
-import markdownify
-from typing import List, Dict, Union, Optional
+from typing import List, Dict, Union, Optional, Tuple
 import os
-from google import genai# Added for the new vision tool
-from PIL import Image # Though not used if uploading by path
-
-# --- Global WebDriver instance ---
-# This is a simple way to share the driver across tool calls within the same agent process.
-# Not suitable for concurrent users or distributed environments without modification.
-_driver = None
-_current_url_in_driver = None
-SCREENSHOT_ACTION_FILENAME = "action_screenshot.jpeg"
-SCREENSHOT_BROWSE_FILENAME = SCREENSHOT_ACTION_FILENAME
+import threading
+import time
+
+from tools.session_context import get_session_id
+from tools.screenshot_diff import ScreenshotDiffer
+from tools.screenshot_encoder import ScreenshotProfile, get_profile, encode_png_screenshot
+from tools.browser_profiles import BrowsingProfile, BROWSING_PROFILES, get_browsing_profile
+from tools.page_readiness import wait_until_ready
+from tools.driver_proxy import instrument_driver, track_webdriver_calls
+from tools.page_store import store_page, format_section
+from server.shared_state import claim_browser, release_browser
+from server.resource_governor import governor, busy_message
+
+# --- Per-session WebDriver instances ---
+# Each WebSocket session gets its own Chrome, owned by the worker process that serves
+# the session. The ownership lease is recorded in the shared state DB so other uvicorn
+# workers can see it; a worker never drives another worker's browser.
 VISION_ANALYSIS_SCREENSHOT_FILENAME = "vision_analysis_temp.jpeg" # Reverted to a unique temporary name
 
-def _get_driver(headless: bool = False) -> webdriver.Chrome:
-    """Initializes and returns a Chrome WebDriver instance, or returns existing one."""
-    global _driver
-    if _driver is None:
-        print(f"[WebDriver] Initializing new Chrome driver (headless: {headless})...")
-        chrome_options = webdriver.ChromeOptions()
-        if headless:
-            chrome_options.add_argument("--headless")
-        chrome_options.add_argument("--no-sandbox")
-        chrome_options.add_argument("--disable-dev-shm-usage") # common in Docker/CI
-        chrome_options.add_argument("window-size=1920,1080") # Set a reasonable window size
-        # The following line is for incognito mode, which can be useful for fresh sessions
-        # chrome_options.add_argument("--incognito") 
-        # Allow popups, as some sign-in flows use them
-        # chrome_options.add_argument("--disable-popup-blocking")
+class _BrowserSession:
+    """The Chrome driver, last tracked URL and screenshot state belonging to one session."""
+    def __init__(self):
+        self.driver = None
+        self.current_url = None
+        self.differ = ScreenshotDiffer()
+        self.profile = get_profile("desktop")
+        self.pending_captures = [] # Raw PNGs of action screenshots, waiting for main.py to encode and send them
+        # Browsing profile state currently applied to the driver (see tools/browser_profiles.py)
+        self.blocked_url_patterns = ()
+        self.viewport = BROWSING_PROFILES["full"].viewport
+        self.page_profile = None # Profile the current page was loaded with
+        self.element_handles: Dict[str, Dict[str, str]] = {} # URL -> compact element handle ("12") -> XPath
+
+_browser_sessions: Dict[str, _BrowserSession] = {}
+_screenshot_deltas: Dict[str, bool] = {} # Sessions whose client can assemble delta frames
+_screenshot_profiles: Dict[str, ScreenshotProfile] = {} # Bandwidth profile chosen by each session's client
+
+def _session() -> _BrowserSession:
+    """Returns the browser state for the session of the running tool call."""
+    session_id = get_session_id()
+    if session_id not in _browser_sessions:
+        state = _BrowserSession()
+        state.differ.allow_delta = _screenshot_deltas.get(session_id, False)
+        state.profile = _screenshot_profiles.get(session_id, state.profile)
+        _browser_sessions[session_id] = state
+    return _browser_sessions[session_id]
+
+def configure_screenshots(session_id: str, deltas: bool, profile: str = "desktop") -> None:
+    """
+    Records whether the session's client accepts delta frames (the legacy static client does not)
+    and which bandwidth profile (see tools/screenshot_encoder.py) its screenshots are encoded with.
+    """
+    _screenshot_deltas[session_id] = deltas
+    _screenshot_profiles[session_id] = get_profile(profile)
+    if session_id in _browser_sessions:
+        _browser_sessions[session_id].differ.allow_delta = deltas
+        _browser_sessions[session_id].profile = _screenshot_profiles[session_id]
+
+def drop_screenshot_settings(session_id: str) -> None:
+    """Forgets the session's screenshot settings; call when the session ends, not when its browser closes."""
+    _screenshot_deltas.pop(session_id, None)
+    _screenshot_profiles.pop(session_id, None)
+
+def pop_screenshot_captures(session_id: str) -> List[Tuple[bytes, ScreenshotDiffer, ScreenshotProfile]]:
+    """
+    Takes the session's pending action screenshots as (png_bytes, differ, profile), oldest first.
+    The caller turns each into a frame with `tools.screenshot_encoder.render_frame`, off the event loop.
+    """
+    state = _browser_sessions.get(session_id)
+    if state is None or not state.pending_captures:
+        return []
+    captures, state.pending_captures = state.pending_captures, []
+    return [(png_bytes, state.differ, state.profile) for png_bytes in captures]
+
+def request_keyframe(session_id: str) -> None:
+    """The client lost track of its frames; send the next screenshot in full."""
+    state = _browser_sessions.get(session_id)
+    if state is not None:
+        state.differ.reset()
+
+def _vision_screenshot_filename() -> str:
+    stem, ext = os.path.splitext(VISION_ANALYSIS_SCREENSHOT_FILENAME)
+    return f"{stem}_{get_session_id()}{ext}"
 
+# --- Chromedriver resolution and warm-up ---
+# ChromeDriverManager().install() checks the network for the latest driver on every call.
+# The resolved path is remembered in-process and on disk so later starts stay offline.
+BROWSER_WARMUP = os.getenv("BROWSER_WARMUP", "0") == "1"
+CHROMEDRIVER_PATH_CACHE = os.getenv(
+    "CHROMEDRIVER_PATH_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "friday", "chromedriver_path")
+)
+PAGE_LOAD_TIMEOUT = 30
+MAX_PARALLEL_TABS = int(os.getenv("MAX_PARALLEL_TABS", "4")) # Tabs browse_urls loads at once
+FIRST_SECTION_CHARS = 2000 # Markdown returned by browse_url(s); the rest is read with read_page_section
+_chromedriver_path = None
+_spare_driver = None # Pre-launched Chrome handed to the first session that needs one
+_warm_up_lock = threading.Lock()
+
+def resolve_chromedriver_path() -> Optional[str]:
+    """
+    Returns the chromedriver executable path, avoiding the network when possible.
+    Order: CHROMEDRIVER_PATH env var, in-process cache, on-disk cache, then ChromeDriverManager
+    (which may download; its result is cached). Returns None if all fail, so Selenium Manager can try.
+    """
+    global _chromedriver_path
+    if _chromedriver_path and os.path.exists(_chromedriver_path):
+        return _chromedriver_path
+
+    env_path = os.getenv("CHROMEDRIVER_PATH")
+    if env_path and os.path.exists(env_path):
+        _chromedriver_path = env_path
+        return _chromedriver_path
+
+    try:
+        with open(CHROMEDRIVER_PATH_CACHE) as f:
+            cached_path = f.read().strip()
+        if cached_path and os.path.exists(cached_path):
+            print(f"[WebDriver] Using cached ChromeDriver path: {cached_path}")
+            _chromedriver_path = cached_path
+            return _chromedriver_path
+    except OSError:
+        pass
+
+    try:
+        from webdriver_manager.chrome import ChromeDriverManager
+        print("[WebDriver] Using ChromeDriverManager to get/install ChromeDriver...")
+        _chromedriver_path = ChromeDriverManager().install()
+        print(f"[WebDriver] ChromeDriver path: {_chromedriver_path}")
         try:
-            # Explicitly use ChromeDriverManager to install/manage chromedriver
-            print("[WebDriver] Using ChromeDriverManager to get/install ChromeDriver...")
-            driver_path = ChromeDriverManager().install()
-            print(f"[WebDriver] ChromeDriver path: {driver_path}")
-            service = ChromeService(executable_path=driver_path)
-            _driver = webdriver.Chrome(service=service, options=chrome_options)
-            print("[WebDriver] ChromeDriver initialized successfully with ChromeDriverManager.")
+            os.makedirs(os.path.dirname(CHROMEDRIVER_PATH_CACHE), exist_ok=True)
+            with open(CHROMEDRIVER_PATH_CACHE, "w") as f:
+                f.write(_chromedriver_path)
+        except OSError as e_cache:
+            print(f"[WebDriver] Could not cache ChromeDriver path: {e_cache}")
+        return _chromedriver_path
+    except Exception as e:
+        print(f"[WebDriver] Error resolving ChromeDriver with ChromeDriverManager: {e}")
+        return None
 
+def _build_chrome_options(headless: bool = False) -> "webdriver.ChromeOptions":
+    chrome_options = webdriver.ChromeOptions()
+    if headless:
+        chrome_options.add_argument("--headless")
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage") # common in Docker/CI
+    width, height = BROWSING_PROFILES["full"].viewport
+    chrome_options.add_argument(f"window-size={width},{height}")
+    # Navigation returns at DOMContentLoaded; full-fidelity profiles wait for `load` themselves
+    # (see _wait_for_page_load), so one browser can serve both browsing profiles.
+    chrome_options.page_load_strategy = "eager"
+    # The following line is for incognito mode, which can be useful for fresh sessions
+    # chrome_options.add_argument("--incognito") 
+    # Allow popups, as some sign-in flows use them
+    # chrome_options.add_argument("--disable-popup-blocking")
+    return chrome_options
+
+def _launch_chrome(headless: bool = False) -> "webdriver.Chrome":
+    """Starts a new Chrome, preferring the resolved chromedriver and falling back to Selenium Manager."""
+    from selenium.webdriver.chrome.service import Service as ChromeService
+    chrome_options = _build_chrome_options(headless)
+    driver_path = resolve_chromedriver_path()
+    driver = None
+    if driver_path:
+        try:
+            driver = webdriver.Chrome(service=ChromeService(executable_path=driver_path), options=chrome_options)
+            print("[WebDriver] ChromeDriver initialized successfully with ChromeDriverManager.")
         except Exception as e:
             print(f"[WebDriver] Error initializing Chrome Driver with ChromeDriverManager: {e}")
-            print("[WebDriver] Falling back to Selenium Manager (default Selenium 4+ behavior)...")
-            try:
-                _driver = webdriver.Chrome(options=chrome_options)
-                print("[WebDriver] ChromeDriver initialized successfully with Selenium Manager.")
-            except Exception as e_fallback:
-                print(f"[WebDriver] Error initializing Chrome Driver with Selenium Manager fallback: {e_fallback}")
-                print("[WebDriver] Ensure ChromeDriver is installed and in your PATH, or webdriver-manager can access it, or Selenium Manager can operate correctly.")
-                raise e_fallback # Re-raise the fallback exception
-        _driver.set_page_load_timeout(30) # Set a page load timeout
-    return _driver
-
-def _navigate_if_needed(driver: webdriver.Chrome, url: str) -> bool:
-    """Navigates to the URL if the driver is not already there. Returns True if navigation occurred."""
-    global _current_url_in_driver
+    if driver is None:
+        print("[WebDriver] Falling back to Selenium Manager (default Selenium 4+ behavior)...")
+        try:
+            driver = webdriver.Chrome(options=chrome_options)
+            print("[WebDriver] ChromeDriver initialized successfully with Selenium Manager.")
+        except Exception as e_fallback:
+            print(f"[WebDriver] Error initializing Chrome Driver with Selenium Manager fallback: {e_fallback}")
+            print("[WebDriver] Ensure ChromeDriver is installed and in your PATH, or webdriver-manager can access it, or Selenium Manager can operate correctly.")
+            raise e_fallback # Re-raise the fallback exception
+    driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT) # Set a page load timeout
+    return instrument_driver(driver)
+
+def warm_up_browser() -> None:
+    """Resolves chromedriver and pre-launches one spare Chrome. Blocking; run it off the event loop."""
+    global _spare_driver
+    with _warm_up_lock:
+        if _spare_driver is not None:
+            return
+    try:
+        driver = _launch_chrome()
+    except Exception as e:
+        print(f"[WebDriver] Browser warm-up failed: {e}")
+        return
+    with _warm_up_lock:
+        if _spare_driver is None:
+            _spare_driver = driver
+            print("[WebDriver] Spare Chrome instance ready.")
+            return
+    driver.quit()
+
+def shutdown_spare_browser() -> None:
+    """Quits the pre-launched Chrome, if it was never handed out."""
+    global _spare_driver
+    with _warm_up_lock:
+        driver, _spare_driver = _spare_driver, None
+    if driver is not None:
+        driver.quit()
+
+def _take_spare_driver() -> "Optional[webdriver.Chrome]":
+    global _spare_driver
+    with _warm_up_lock:
+        driver, _spare_driver = _spare_driver, None
+    if driver is not None and BROWSER_WARMUP:
+        # Keep one warm instance around for the next session.
+        threading.Thread(target=warm_up_browser, name="browser-warm-up", daemon=True).start()
+    return driver
+
+def _get_driver(headless: bool = False) -> "webdriver.Chrome":
+    """Initializes and returns the current session's Chrome WebDriver instance, or returns the existing one."""
+    state = _session()
+    if state.driver is None:
+        session_id = get_session_id()
+        # Browser tools are admitted (and queued) by the agent's tool callbacks; this also
+        # covers tools like fetch_page that only start Chrome when a page needs it.
+        if not governor.try_acquire("browser", session_id):
+            raise RuntimeError(busy_message("browser"))
+        if not claim_browser(session_id):
+            governor.release("browser", session_id)
+            raise RuntimeError(f"Browser for session {session_id} is owned by another worker process.")
+        spare_driver = None if headless else _take_spare_driver()
+        if spare_driver is not None:
+            print(f"[WebDriver] Using pre-launched Chrome for session {session_id}.")
+            state.driver = spare_driver
+            return state.driver
+        print(f"[WebDriver] Initializing new Chrome driver for session {session_id} (headless: {headless})...")
+        try:
+            state.driver = _launch_chrome(headless)
+        except Exception:
+            release_browser(session_id)
+            governor.release("browser", session_id)
+            raise
+    return state.driver
+
+def _apply_browsing_profile(driver: "webdriver.Chrome", profile: BrowsingProfile) -> None:
+    """Switches the driver's URL blocking and window size to the profile; no-op when they already match."""
+    state = _session()
+    if state.blocked_url_patterns != profile.blocked_url_patterns:
+        if not state.blocked_url_patterns:
+            driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(profile.blocked_url_patterns)})
+        state.blocked_url_patterns = profile.blocked_url_patterns
+    if state.viewport != profile.viewport:
+        driver.set_window_size(*profile.viewport)
+        state.viewport = profile.viewport
+
+def _wait_for_page_load(driver: "webdriver.Chrome", profile: BrowsingProfile) -> None:
+    """Chrome runs with the eager strategy; profiles with the "normal" strategy also wait for the load event."""
+    if profile.page_load_strategy != "normal":
+        return
+    from selenium.webdriver.support.ui import WebDriverWait
+    WebDriverWait(driver, PAGE_LOAD_TIMEOUT).until(
+        lambda d: d.execute_script("return document.readyState") == "complete"
+    )
+
+def _navigate_if_needed(driver: "webdriver.Chrome", url: str, profile: Optional[BrowsingProfile] = None) -> bool:
+    """
+    Navigates to the URL if the driver is not already there. Returns True if navigation occurred.
+    The page is also reloaded when it was loaded with blocked resources and the profile wants the full page.
+    """
+    state = _session()
+    profile = profile or BROWSING_PROFILES["full"]
     # Normalize URLs for comparison (e.g., remove trailing slash)
     normalized_current_url = driver.current_url.strip('/') if driver.current_url else None
     normalized_target_url = url.strip('/') if url else None
+    page_missing_resources = (state.page_profile is not None and state.page_profile.blocks_resources
+                              and not profile.blocks_resources)
     
-    if normalized_current_url != normalized_target_url or _current_url_in_driver != normalized_target_url:
-        print(f"[WebDriver] Navigating to: {url} (was on {driver.current_url}, tracked: {_current_url_in_driver})")
+    if normalized_current_url != normalized_target_url or state.current_url != normalized_target_url or page_missing_resources:
+        print(f"[WebDriver] Navigating to: {url} (was on {driver.current_url}, tracked: {state.current_url}, profile: {profile.name})")
         try:
+            _apply_browsing_profile(driver, profile)
             driver.get(url)
-            _current_url_in_driver = driver.current_url.strip('/') # Store normalized
+            _wait_for_page_load(driver, profile)
+            state.current_url = driver.current_url.strip('/') # Store normalized
+            state.page_profile = profile
             return True
         except TimeoutException:
             print(f"[WebDriver] Timeout navigating to {url}")
@@ -79,7 +298,7 @@ def _navigate_if_needed(driver: webdriver.Chrome, url: str) -> bool:
             raise
     return False
 
-def _capture_and_save_screenshot(driver: webdriver.Chrome, filename: str) -> bool:
+def _capture_and_save_screenshot(driver: "webdriver.Chrome", filename: str) -> bool:
     """Captures a screenshot and saves it to the filename. Returns True on success, False on error."""
     try:
         # Ensure the directory for the screenshot exists if it's not the current dir
@@ -89,44 +308,261 @@ def _capture_and_save_screenshot(driver: webdriver.Chrome, filename: str) -> boo
         if os.path.exists(filename):
             os.remove(filename) # Remove old screenshot if it exists
             print(f"[WebDriver] Removed existing screenshot: {filename}")
-        driver.save_screenshot(filename)
+        png_bytes = driver.get_screenshot_as_png()
+        if filename.lower().endswith((".jpg", ".jpeg")):
+            # save_screenshot always writes PNG; encode a real JPEG for .jpeg names
+            png_bytes = encode_png_screenshot(png_bytes, get_profile("desktop"))
+        with open(filename, "wb") as f:
+            f.write(png_bytes)
         print(f"[WebDriver] Screenshot saved to {filename}")
         return True
     except Exception as e:
         print(f"[WebDriver] Error capturing or saving screenshot {filename}: {e}")
         return False
 
-def browse_url(url: str) -> str:
-    """Load the url, take a screenshot, and return page source as markdown. Screenshot is saved server-side."""
-    global _current_url_in_driver
+def _capture_action_screenshot(driver: "webdriver.Chrome") -> bool:
+    """
+    Captures the screenshot shown to the user after an action and queues the raw PNG for
+    main.py, which diffs, downscales and encodes it in the screenshot encoder pool
+    (tools/screenshot_encoder.py) so the CPU work stays off the event loop. Returns True on success.
+    """
+    state = _session()
     try:
-        driver = _get_driver()
-        _navigate_if_needed(driver, url)
-        
-        page_source_markdown = markdownify.markdownify(driver.page_source)
-        _current_url_in_driver = driver.current_url.strip('/')
+        state.pending_captures = [driver.get_screenshot_as_png()]
+        return True
+    except Exception as e:
+        print(f"[WebDriver] Error capturing action screenshot: {e}")
+        return False
+
+def render_page_markdown(url: str, fast: bool = True) -> Tuple[str, str]:
+    """
+    Loads the URL in the session's browser and returns (final_url, markdown) without a screenshot.
+    Used by tools that only need the rendered text (see tools/adaptive_fetch.py). Raises on failure.
+    """
+    driver = _get_driver()
+    profile = get_browsing_profile("fast" if fast else "full")
+    if _navigate_if_needed(driver, url, profile) and profile.page_load_strategy != "normal":
+        # DOMContentLoaded fires before client-side apps render; give them until the DOM goes quiet
+        wait_until_ready(driver)
+    import markdownify
+    page_source_markdown = markdownify.markdownify(driver.page_source)
+    _session().current_url = driver.current_url.strip('/')
+    return driver.current_url, page_source_markdown
+
+@track_webdriver_calls
+def browse_url(url: str, fast: bool = False) -> str:
+    """
+    Load the url, take a screenshot, and return page source as markdown. Screenshot is saved server-side.
+    Set fast=True when only the text is needed: images, media, fonts and trackers are blocked and the
+    page is read as soon as the DOM is ready, so the screenshot will look incomplete.
+    """
+    try:
+        final_url, page_source_markdown = render_page_markdown(url, fast=fast)
+        page = store_page(page_source_markdown, url, final_url)
         
-        _capture_and_save_screenshot(driver, SCREENSHOT_ACTION_FILENAME)
+        _capture_action_screenshot(_session().driver)
         
-        text_output = f"Successfully browsed to {driver.current_url}. Page content (markdown):\n{page_source_markdown[:2000]}... (truncated if long)"
+        text_output = f"Successfully browsed to {final_url}. Page content (markdown):\n{format_section(page, length=FIRST_SECTION_CHARS)}"
         return text_output
     except Exception as e:
-        _current_url_in_driver = None 
+        _session().current_url = None 
         error_message = f"Error browsing {url}: {str(e)}"
         return error_message
 
-def find_interactive_elements(url: str, keywords: Optional[str] = None) -> Union[List[Dict[str, str]], str]:
+def _open_loading_tab(driver: "webdriver.Chrome", url: str, profile: BrowsingProfile) -> str:
+    """Opens a new tab and starts loading the URL without waiting for it. Returns the window handle."""
+    driver.switch_to.new_window("tab")
+    if profile.blocks_resources:
+        # CDP network settings are per tab; the tab is closed afterwards, so the session state is untouched
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": list(profile.blocked_url_patterns)})
+    driver.execute_script("window.location.href = arguments[0];", url)
+    return driver.current_window_handle
+
+def _read_loaded_tab(driver: "webdriver.Chrome", handle: str, url: str, profile: BrowsingProfile,
+                     deadline: float, screenshot: bool) -> Dict[str, str]:
+    """Switches to a tab opened by _open_loading_tab, waits for it until `deadline` and extracts its markdown."""
+    import markdownify
+    from selenium.webdriver.support.ui import WebDriverWait
+    driver.switch_to.window(handle)
+    ready_states = ("complete",) if profile.page_load_strategy == "normal" else ("interactive", "complete")
+    result = {"url": url}
+    try:
+        WebDriverWait(driver, max(0.1, deadline - time.monotonic()), poll_frequency=0.1).until(
+            lambda d: d.current_url not in ("about:blank", "") and d.execute_script("return document.readyState") in ready_states
+        )
+    except TimeoutException:
+        result["note"] = f"Page was still loading after {PAGE_LOAD_TIMEOUT}s; content may be partial."
+    result["final_url"] = driver.current_url
+    result["title"] = driver.title
+    page = store_page(markdownify.markdownify(driver.page_source), url, result["final_url"])
+    result["markdown"] = format_section(page, length=FIRST_SECTION_CHARS)
+    if screenshot:
+        _session().pending_captures.append(driver.get_screenshot_as_png())
+    return result
+
+@track_webdriver_calls
+def browse_urls(urls: List[str], screenshots: bool = False, fast: bool = True) -> List[Dict[str, str]]:
+    """
+    Loads several URLs at once in parallel browser tabs and returns each page's markdown.
+    Use this instead of calling browse_url repeatedly when you need to read several pages:
+    the total time is close to the slowest page instead of the sum of all pages.
+    Set screenshots=True to also show a screenshot of every page. fast=True (the default)
+    skips images, media and trackers; set it to False for pages you want to look at.
+    Returns a list with one entry per URL: 'url', 'final_url', 'title', 'markdown', or 'error'.
+    """
+    if not urls:
+        return []
+    profile = get_browsing_profile("fast" if fast else "full")
+    try:
+        driver = _get_driver()
+        original_handle = driver.current_window_handle
+    except Exception as e:
+        return [{"url": url, "error": f"Error starting browser: {str(e)}"} for url in urls]
+
+    results = []
+    start = time.monotonic()
+    # Chrome loads the pages of all open tabs concurrently; chromedriver commands stay sequential.
+    for batch_start in range(0, len(urls), MAX_PARALLEL_TABS):
+        batch = urls[batch_start:batch_start + MAX_PARALLEL_TABS]
+        tabs = []
+        try:
+            for url in batch:
+                try:
+                    tabs.append((url, _open_loading_tab(driver, url, profile)))
+                except Exception as e:
+                    tabs.append((url, None))
+                    results.append({"url": url, "error": f"Error opening tab for {url}: {str(e)}"})
+            deadline = time.monotonic() + PAGE_LOAD_TIMEOUT
+            for url, handle in tabs:
+                if handle is None:
+                    continue
+                try:
+                    results.append(_read_loaded_tab(driver, handle, url, profile, deadline, screenshots))
+                except Exception as e:
+                    results.append({"url": url, "error": f"Error browsing {url}: {str(e)}"})
+        finally:
+            for _, handle in tabs:
+                if handle is None:
+                    continue
+                try:
+                    driver.switch_to.window(handle)
+                    driver.close()
+                except Exception as e_close:
+                    print(f"[WebDriver] Could not close tab {handle}: {e_close}")
+            driver.switch_to.window(original_handle)
+
+    order = {url: i for i, url in enumerate(urls)}
+    results.sort(key=lambda result: order.get(result["url"], len(urls)))
+    print(f"[WebDriver] Loaded {len(urls)} URLs in parallel tabs (max {MAX_PARALLEL_TABS} at once) in {time.monotonic() - start:.2f}s")
+    return results
+
+# Collects every interactive element in one round trip, instead of ~10 WebDriver calls per element.
+_ELEMENT_SNAPSHOT_SCRIPT = """
+function getPathTo(element) {
+    if (element.id !== '') return 'id("' + element.id + '")';
+    if (element === document.body) return element.tagName.toLowerCase();
+    var ix = 0;
+    var siblings = element.parentNode.childNodes;
+    for (var i = 0; i < siblings.length; i++) {
+        var sibling = siblings[i];
+        if (sibling === element) return getPathTo(element.parentNode) + '/' + element.tagName.toLowerCase() + '[' + (ix + 1) + ']';
+        if (sibling.nodeType === 1 && sibling.tagName === element.tagName) ix++;
+    }
+}
+var selector = 'a[href], button, input:not([type="hidden"]), textarea, select, details, details > summary';
+return Array.from(document.querySelectorAll(selector)).map(function (el) {
+    var rect = el.getBoundingClientRect();
+    var style = window.getComputedStyle(el);
+    var text = (el.innerText || el.value || el.getAttribute('aria-label') || el.getAttribute('placeholder') || el.getAttribute('title') || '');
+    return {
+        xpath: getPathTo(el),
+        tag: el.tagName.toLowerCase(),
+        text: text.replace(/\\s+/g, ' ').trim().slice(0, 80),
+        type: el.getAttribute('type') || '',
+        name: el.getAttribute('name') || el.id || '',
+        placeholder: el.getAttribute('placeholder') || '',
+        href: el.tagName === 'A' ? el.getAttribute('href') : '',
+        visible: rect.width > 0 && rect.height > 0 && style.visibility !== 'hidden' && style.display !== 'none',
+        enabled: !el.disabled && el.getAttribute('aria-disabled') !== 'true',
+        inViewport: rect.bottom > 0 && rect.top < window.innerHeight
+    };
+});
+"""
+
+def _rank_element(element: Dict, keyword_terms: List[str]) -> float:
+    """Relevance of an element for the compact listing: keyword matches first, then what is on screen and labelled."""
+    haystack = " ".join((element["text"], element["name"], element["placeholder"], element["href"] or "")).lower()
+    score = 10.0 * sum(term in haystack for term in keyword_terms)
+    score += 2.0 if element["inViewport"] else 0.0
+    score += 1.0 if element["text"] else 0.0
+    score += 1.0 if element["tag"] in ("input", "textarea", "select", "button") else 0.0
+    return score
+
+def _compact_interactive_elements(driver: "webdriver.Chrome", keywords: Optional[str], max_elements: int) -> str:
+    """
+    Lists visible, enabled elements as 'handle|tag|text|details' rows, best first, at most max_elements.
+    Handles are short numbers mapped to XPaths server-side (see _resolve_element_id).
+    """
+    elements = driver.execute_script(_ELEMENT_SNAPSHOT_SCRIPT) or []
+    usable = [element for element in elements if element["visible"] and element["enabled"]]
+    keyword_terms = keywords.lower().split() if keywords else []
+    if keyword_terms:
+        usable = [element for element in usable if _rank_element(element, keyword_terms) >= 10]
+    # Stable sort keeps document order among equally relevant elements
+    ranked = sorted(usable, key=lambda element: -_rank_element(element, keyword_terms))[:max(1, max_elements)]
+
+    origin = "/".join(driver.current_url.split("/")[:3])
+    handles, rows = {}, []
+    for number, element in enumerate(ranked, start=1):
+        handles[str(number)] = element["xpath"]
+        tag = f"{element['tag']}[{element['type']}]" if element["type"] and element["tag"] in ("input", "button") else element["tag"]
+        details = []
+        if element["href"]:
+            href = element["href"][len(origin):] if element["href"].startswith(origin) else element["href"]
+            details.append(href[:60])
+        if element["name"]:
+            details.append(f"name={element['name'][:30]}")
+        if element["placeholder"] and element["placeholder"] != element["text"]:
+            details.append(f"placeholder={element['placeholder'][:30]}")
+        rows.append(f"{number}|{tag}|{element['text'].replace('|', '/')}|{' '.join(details)}")
+    _session().element_handles[driver.current_url.strip('/')] = handles
+
+    if not rows:
+        suffix = f" matching keywords: '{keywords}'" if keywords else ""
+        return f"No visible interactive elements found on {driver.current_url}{suffix}."
+    header = (f"Interactive elements on {driver.current_url} (top {len(rows)} of {len(usable)} visible and enabled, "
+              f"{len(elements) - len([e for e in elements if e['visible'] and e['enabled']])} hidden/disabled dropped). "
+              f"Pass the handle number as element_id.\nhandle|tag|text|details")
+    return header + "\n" + "\n".join(rows)
+
+def _resolve_element_id(element_id: str, url: str) -> str:
+    """Maps a compact handle from find_interactive_elements(compact=True) on the URL to its XPath; XPaths pass through."""
+    handle = str(element_id).strip()
+    if not handle.isdigit():
+        return element_id
+    handles = _session().element_handles.get(url.strip('/')) or _session().element_handles.get(_session().current_url or "", {})
+    return handles.get(handle, element_id)
+
+@track_webdriver_calls
+def find_interactive_elements(url: str, keywords: Optional[str] = None, compact: bool = False, max_elements: int = 40) -> Union[List[Dict[str, str]], str]:
     """
     Navigates to the URL and finds interactive elements (links, buttons, inputs).
     Optionally filters by keywords in text or attributes.
     Returns a list of elements, each with an 'id' (XPath), 'tag', 'text', and 'attributes', or an error string.
+    With compact=True, returns a short table instead: one 'handle|tag|text|details' row per visible,
+    enabled element, most relevant first, at most max_elements rows. Use the handle number as element_id.
     NOTE: This tool does NOT save a screenshot itself.
     """
-    global _current_url_in_driver
     try:
         driver = _get_driver()
         _navigate_if_needed(driver, url)
 
+        if compact:
+            listing = _compact_interactive_elements(driver, keywords, max_elements)
+            _session().current_url = driver.current_url.strip('/')
+            return listing
+
         elements_data = []
         selenium_elements = driver.find_elements(By.XPATH, "//a[@href] | //button | //input[not(@type='hidden')] | //textarea | //select | //details | //summary[parent::details]")
         
@@ -212,117 +648,226 @@ def find_interactive_elements(url: str, keywords: Optional[str] = None) -> Union
                 print(f"[WebDriver] Error processing an element: {e_inner}")
                 continue
 
-        _current_url_in_driver = driver.current_url.strip('/')
+        _session().current_url = driver.current_url.strip('/')
         if not elements_data and keywords:
             return f"No interactive elements found on {driver.current_url} matching keywords: '{keywords}'."
         elif not elements_data:
             return f"No interactive elements found on {driver.current_url}."
         return elements_data
     except Exception as e:
-        _current_url_in_driver = None
+        _session().current_url = None
         return f"Error finding interactive elements on {url}: {str(e)}"
 
+@track_webdriver_calls
 def click_element_by_id(url: str, element_id: str) -> str:
     """
     Navigates to the URL if needed, finds an element by its ID (XPath), clicks it.
     Returns a status string. A screenshot is saved server-side.
     """
-    global _current_url_in_driver
     try:
         driver = _get_driver()
         _navigate_if_needed(driver, url)
         
         print(f"[WebDriver] Attempting to find element by ID (XPath): {element_id}")
-        element_to_click = driver.find_element(By.XPATH, element_id)
+        element_to_click = driver.find_element(By.XPATH, _resolve_element_id(element_id, url))
 
         element_text = (element_to_click.text or element_to_click.get_attribute('value') or element_to_click.get_attribute('aria-label') or "[no text]")[:100].strip()
         print(f"[WebDriver] Found element '{element_text}' (tag: {element_to_click.tag_name}), attempting click...")
+        url_before_click = driver.current_url
         element_to_click.click()
         
-        driver.implicitly_wait(0.5) 
+        readiness = wait_until_ready(driver, previous_url=url_before_click)
+        print(f"[WebDriver] After click: {readiness.describe()}")
 
         new_url = driver.current_url
-        _current_url_in_driver = new_url.strip('/')
+        _session().current_url = new_url.strip('/')
         
-        _capture_and_save_screenshot(driver, SCREENSHOT_ACTION_FILENAME)
+        _capture_action_screenshot(driver)
         
-        text_output = f"Successfully clicked element (ID/XPath: {element_id}, Text: '{element_text}'). Current URL is now: {new_url}"
+        text_output = f"Successfully clicked element (ID/XPath: {element_id}, Text: '{element_text}'). Current URL is now: {new_url} ({readiness.describe()})"
         return text_output
     except TimeoutException:
         error_message = f"Timeout after attempting to click element (ID/XPath: {element_id}) on {url}. Page may have been navigating or element not interactable."
         return error_message
     except Exception as e:
-        _current_url_in_driver = None
+        _session().current_url = None
         error_message = f"Error clicking element (ID/XPath: {element_id}) on {url}: {str(e)}"
         return error_message
 
+@track_webdriver_calls
 def type_into_element_by_id(url: str, element_id: str, text_to_type: str) -> str:
     """
     Navigates to URL, finds input element by ID (XPath), types text.
     Returns a status string. A screenshot is saved server-side.
     """
-    global _current_url_in_driver
     try:
         driver = _get_driver()
         _navigate_if_needed(driver, url)
 
         print(f"[WebDriver] Attempting to find input element by ID (XPath): {element_id} to type in.")
-        element_to_type_into = driver.find_element(By.XPATH, element_id)
+        element_to_type_into = driver.find_element(By.XPATH, _resolve_element_id(element_id, url))
         
         element_text = (element_to_type_into.get_attribute('placeholder') or element_to_type_into.get_attribute('name') or "[input field]")[:50].strip()
         print(f"[WebDriver] Found input element '{element_text}', attempting to type...")
+        url_before_typing = driver.current_url
         element_to_type_into.clear()
         element_to_type_into.send_keys(text_to_type)
         
-        _current_url_in_driver = driver.current_url.strip('/')
-        _capture_and_save_screenshot(driver, SCREENSHOT_ACTION_FILENAME)
+        # Let autocomplete dropdowns and validation messages render before the screenshot
+        readiness = wait_until_ready(driver, previous_url=url_before_typing, timeout=2.0)
+        print(f"[WebDriver] After typing: {readiness.describe()}")
+
+        _session().current_url = driver.current_url.strip('/')
+        _capture_action_screenshot(driver)
             
-        text_output = f"Successfully typed '{text_to_type}' into element (ID/XPath: {element_id}, Label/Name: '{element_text}')."
+        text_output = f"Successfully typed '{text_to_type}' into element (ID/XPath: {element_id}, Label/Name: '{element_text}'). ({readiness.describe()})"
         return text_output
     except TimeoutException:
         error_message = f"Timeout when trying to type into element (ID/XPath: {element_id}) on {url}."
         return error_message
     except Exception as e:
-        _current_url_in_driver = None
+        _session().current_url = None
         error_message = f"Error typing into element (ID/XPath: {element_id}) on {url}: {str(e)}"
         return error_message
 
+_SCROLL_SCRIPTS = {
+    "down": "window.scrollBy(0, window.innerHeight);",
+    "up": "window.scrollBy(0, -window.innerHeight);",
+    "top": "window.scrollTo(0, 0);",
+    "bottom": "window.scrollTo(0, document.body.scrollHeight);",
+}
+
+@track_webdriver_calls
 def scroll_page_at_url(url: str, direction: str) -> str:
     """
     Navigates to URL, scrolls page. Returns status string. Screenshot saved server-side.
     Directions: "up", "down", "top", "bottom".
     """
-    global _current_url_in_driver
     try:
         driver = _get_driver()
         _navigate_if_needed(driver, url)
 
-        if direction == "down":
-            driver.execute_script("window.scrollBy(0, window.innerHeight);")
-        elif direction == "up":
-            driver.execute_script("window.scrollBy(0, -window.innerHeight);")
-        elif direction == "top":
-            driver.execute_script("window.scrollTo(0, 0);")
-        elif direction == "bottom":
-            driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
-        else:
+        if direction not in _SCROLL_SCRIPTS:
             return f"Error: Invalid scroll direction '{direction}'. Use 'up', 'down', 'top', or 'bottom'."
+        driver.execute_script(_SCROLL_SCRIPTS[direction])
         
-        driver.implicitly_wait(0.2) 
+        # Lazy-loaded content and sticky headers settle shortly after the scroll
+        readiness = wait_until_ready(driver, timeout=2.0)
+        print(f"[WebDriver] After scroll: {readiness.describe()}")
 
-        _current_url_in_driver = driver.current_url.strip('/')
-        _capture_and_save_screenshot(driver, SCREENSHOT_ACTION_FILENAME)
+        _session().current_url = driver.current_url.strip('/')
+        _capture_action_screenshot(driver)
 
-        text_output = f"Successfully scrolled {direction} on {driver.current_url}. New content might be visible."
+        text_output = f"Successfully scrolled {direction} on {driver.current_url}. New content might be visible. ({readiness.describe()})"
         return text_output
     except TimeoutException:
         error_message = f"Timeout while scrolling {direction} on {url}."
         return error_message
     except Exception as e:
-        _current_url_in_driver = None
+        _session().current_url = None
         error_message = f"Error scrolling {direction} on {url}: {str(e)}"
         return error_message
 
+MAX_BATCH_ACTIONS = 25
+# Total of all "wait" steps in one run_browser_actions call; the tool runs on the event loop
+MAX_BATCH_WAIT_SECONDS = 3
+# Total time the steps of one call spend waiting for the page to settle, for the same reason
+MAX_BATCH_SETTLE_SECONDS = 6
+
+def _run_action_step(driver: "webdriver.Chrome", url: str, action: str, wait_left: float, settle_left: float) -> str:
+    """
+    Performs one run_browser_actions step and waits for the page to settle, for at most
+    `settle_left` seconds. "wait" steps sleep at most `wait_left` seconds. Returns a short description.
+    """
+    parts = action.strip().split(maxsplit=2)
+    verb = parts[0].lower() if parts else ""
+    if verb in ("click", "type", "enter") and len(parts) < (3 if verb == "type" else 2):
+        raise ValueError(f"'{verb}' needs an element id" + (" and the text to type" if verb == "type" else ""))
+
+    if verb == "click":
+        element = driver.find_element(By.XPATH, _resolve_element_id(parts[1], url))
+        url_before = driver.current_url
+        element.click()
+        return f"clicked; {wait_until_ready(driver, previous_url=url_before, timeout=settle_left).describe()}"
+    if verb in ("type", "enter"):
+        from selenium.webdriver.common.keys import Keys
+        element = driver.find_element(By.XPATH, _resolve_element_id(parts[1], url))
+        url_before = driver.current_url
+        if verb == "type":
+            element.clear()
+            element.send_keys(parts[2])
+        else:
+            element.send_keys(Keys.ENTER)
+        return f"{'typed' if verb == 'type' else 'pressed Enter'}; {wait_until_ready(driver, previous_url=url_before, timeout=min(2.0 if verb == 'type' else 3.0, settle_left)).describe()}"
+    if verb == "scroll":
+        direction = parts[1].lower() if len(parts) > 1 else "down"
+        if direction not in _SCROLL_SCRIPTS:
+            raise ValueError(f"invalid scroll direction '{direction}'; use up, down, top or bottom")
+        driver.execute_script(_SCROLL_SCRIPTS[direction])
+        return f"scrolled {direction}; {wait_until_ready(driver, timeout=min(2.0, settle_left)).describe()}"
+    if verb == "wait":
+        requested = float(parts[1]) if len(parts) > 1 else 1.0
+        seconds = max(0.0, min(requested, wait_left))
+        time.sleep(seconds)
+        return f"waited {seconds:g}s" + (f" (wait budget of {MAX_BATCH_WAIT_SECONDS}s per call used up)" if seconds < requested else "")
+    raise ValueError(f"unknown action '{verb}'; use click, type, enter, scroll or wait")
+
+@track_webdriver_calls
+def run_browser_actions(url: str, actions: List[str]) -> Dict[str, Union[str, List[Dict[str, str]]]]:
+    """
+    Runs several browser steps on the page at the URL in one call, in order, stopping at the first
+    failure, and shows one screenshot at the end. Use it for multi-step flows such as filling and
+    submitting a form, instead of one click/type call per field. Each action is a string:
+      "click <element_id>"          click an element
+      "type <element_id> <text>"    replace the field's content with the text (the rest of the string)
+      "enter <element_id>"          press Enter in a field (e.g. to submit a search)
+      "scroll <up|down|top|bottom>" scroll the page
+      "wait <seconds>"              pause, e.g. for an animation (at most 3s in total per call)
+    element_id is a handle number from find_interactive_elements(compact=True), or an XPath without spaces.
+    Returns 'status', 'final_url' and 'steps' with a status and timing per step.
+    """
+    if not actions:
+        return {"status": "error", "final_url": url, "steps": [], "error": "No actions given."}
+    if len(actions) > MAX_BATCH_ACTIONS:
+        return {"status": "error", "final_url": url, "steps": [],
+                "error": f"Too many actions ({len(actions)}); at most {MAX_BATCH_ACTIONS} per call."}
+    steps = []
+    status = "completed"
+    driver = None
+    wait_left = float(MAX_BATCH_WAIT_SECONDS)
+    settle_left = float(MAX_BATCH_SETTLE_SECONDS)
+    try:
+        driver = _get_driver()
+        _navigate_if_needed(driver, url)
+        for number, action in enumerate(actions, start=1):
+            start = time.perf_counter()
+            step = {"step": str(number), "action": action}
+            try:
+                step["result"] = _run_action_step(driver, url, action, wait_left, settle_left)
+                step["status"] = "ok"
+            except Exception as e:
+                step["status"] = "failed"
+                step["result"] = str(e).split("\n")[0][:300]
+                status = f"stopped at step {number}"
+            elapsed = time.perf_counter() - start
+            if action.strip().lower().startswith("wait"):
+                wait_left = max(0.0, wait_left - elapsed)
+            else:
+                settle_left = max(0.0, settle_left - elapsed)
+            step["seconds"] = f"{elapsed:.2f}"
+            steps.append(step)
+            print(f"[WebDriver] Batch step {number}/{len(actions)} {step['status']} in {step['seconds']}s: {action.split(maxsplit=1)[0] if action.strip() else ''}")
+            if step["status"] != "ok":
+                break
+        final_url = driver.current_url
+        _session().current_url = final_url.strip('/')
+        _capture_action_screenshot(driver)
+        return {"status": status, "final_url": final_url, "steps": steps}
+    except Exception as e:
+        _session().current_url = None
+        return {"status": "error", "final_url": url, "steps": steps, "error": f"Error running browser actions on {url}: {str(e)}"}
+
+@track_webdriver_calls
 def analyze_current_view_with_gemini(prompt: str) -> str:
     """
     Captures the current browser view, sends it with a prompt to a Gemini vision model for analysis,
@@ -331,26 +876,28 @@ def analyze_current_view_with_gemini(prompt: str) -> str:
     or to get a description/analysis of the current view based on a specific question.
     Example prompt: "What is the main headline on this page?" or "Describe the layout of this form."
     """
-    global _driver
-    if not _driver:
+    driver = _session().driver
+    if not driver:
         return "Error: Browser is not active. Please use 'browse_url' first."
+    screenshot_filename = _vision_screenshot_filename()
 
     api_key = os.environ.get("GOOGLE_API_KEY")
     if not api_key:
         return "Error: GOOGLE_API_KEY not found in environment variables."
 
     try:
-        print(f"[WebDriver] Capturing screenshot for Gemini analysis: {VISION_ANALYSIS_SCREENSHOT_FILENAME}")
-        if not _capture_and_save_screenshot(_driver, VISION_ANALYSIS_SCREENSHOT_FILENAME):
+        print(f"[WebDriver] Capturing screenshot for Gemini analysis: {screenshot_filename}")
+        if not _capture_and_save_screenshot(driver, screenshot_filename):
             return "Error: Failed to capture screenshot for analysis."
 
         print(f"[GeminiVision] Initializing Gemini client for model 'gemini-2.0-flash'.")
         # Using the client structure from the user's snippet
+        from google import genai
         client = genai.Client(api_key=api_key)
         
-        print(f"[GeminiVision] Uploading file: {VISION_ANALYSIS_SCREENSHOT_FILENAME}")
+        print(f"[GeminiVision] Uploading file: {screenshot_filename}")
         # client.files.upload expects 'file' not 'path' as per Gemini documentation
-        uploaded_file = client.files.upload(file_path=VISION_ANALYSIS_SCREENSHOT_FILENAME) # Corrected: using file_path
+        uploaded_file = client.files.upload(file_path=screenshot_filename) # Corrected: using file_path
         print(f"[GeminiVision] File uploaded successfully: {uploaded_file.name}")
 
         print(f"[GeminiVision] Generating content with prompt: '{prompt}'")
@@ -370,104 +917,97 @@ def analyze_current_view_with_gemini(prompt: str) -> str:
         print(f"[GeminiVision ERROR] {error_message}")
         return error_message
     finally:
-        if os.path.exists(VISION_ANALYSIS_SCREENSHOT_FILENAME):
+        if os.path.exists(screenshot_filename):
             try:
-                os.remove(VISION_ANALYSIS_SCREENSHOT_FILENAME)
-                print(f"[GeminiVision] Cleaned up temporary screenshot: {VISION_ANALYSIS_SCREENSHOT_FILENAME}")
+                os.remove(screenshot_filename)
+                print(f"[GeminiVision] Cleaned up temporary screenshot: {screenshot_filename}")
             except Exception as e_remove:
-                print(f"[GeminiVision ERROR] Failed to remove temporary screenshot {VISION_ANALYSIS_SCREENSHOT_FILENAME}: {e_remove}")
+                print(f"[GeminiVision ERROR] Failed to remove temporary screenshot {screenshot_filename}: {e_remove}")
 
 def close_browser_session() -> str:
     """Closes the shared browser session if it's active."""
-    global _driver, _current_url_in_driver
-    if _driver:
-        try:
-            print("[WebDriver] Closing browser session...")
-            # Before quitting, ensure any saved screenshot files are cleaned up if they are temporary.
-            # For now, these filenames are fixed, so they will be overwritten.
-            # Example:
-            # if os.path.exists(SCREENSHOT_ACTION_FILENAME): os.remove(SCREENSHOT_ACTION_FILENAME)
-            # if os.path.exists(SCREENSHOT_BROWSE_FILENAME): os.remove(SCREENSHOT_BROWSE_FILENAME)
-            
-            # Clean up the screenshot file when explicitly closing the browser
-            if os.path.exists(SCREENSHOT_ACTION_FILENAME):
-                try:
-                    os.remove(SCREENSHOT_ACTION_FILENAME)
-                    print(f"[WebDriver] Removed screenshot file {SCREENSHOT_ACTION_FILENAME} during browser close.")
-                except Exception as e_remove:
-                    print(f"[WebDriver] Error removing screenshot file {SCREENSHOT_ACTION_FILENAME}: {e_remove}")
+    return close_browser_for_session(get_session_id())
 
-            _driver.quit()
+def close_browser_for_session(session_id: str) -> str:
+    """Quits the session's browser (if any) and releases its ownership lease and browser slot."""
+    governor.release("browser", session_id)
+    state = _browser_sessions.pop(session_id, None)
+    if state and state.driver:
+        try:
+            print(f"[WebDriver] Closing browser session for {session_id}...")
+            state.driver.quit()
             return "Browser session closed successfully."
         except Exception as e:
             print(f"[WebDriver] Error while quitting driver: {e}")
             return f"Error closing browser session: {e}"
         finally:
-            _driver = None
-            _current_url_in_driver = None
-            print("[WebDriver] Browser session closed and driver set to None.")
+            release_browser(session_id)
+            print(f"[WebDriver] Browser session for {session_id} closed and driver released.")
     else:
-        print("[WebDriver] close_browser_session called but no active driver found.")
+        print(f"[WebDriver] close_browser_session called but no active driver found for {session_id}.")
         return "No active browser session to close."
 
+@track_webdriver_calls
 def sign_in_to_website(url: str, username_field_xpath: str, password_field_xpath: str, submit_button_xpath: str, username: str, password: str) -> str:
     """
     Navigates to the login page URL, enters username and password into specified fields,
     clicks the submit button, and saves a screenshot.
     Returns a status string.
     """
-    global _current_url_in_driver
     try:
         driver = _get_driver() # Ensures driver is non-headless by default now
         _navigate_if_needed(driver, url)
 
         # Type username
         print(f"[WebDriver] Attempting to find username field by XPath: {username_field_xpath}")
-        username_element = driver.find_element(By.XPATH, username_field_xpath)
+        username_element = driver.find_element(By.XPATH, _resolve_element_id(username_field_xpath, url))
         username_element.clear()
         username_element.send_keys(username)
         print(f"[WebDriver] Typed username into element: {username_field_xpath}")
 
         # Type password
         print(f"[WebDriver] Attempting to find password field by XPath: {password_field_xpath}")
-        password_element = driver.find_element(By.XPATH, password_field_xpath)
+        password_element = driver.find_element(By.XPATH, _resolve_element_id(password_field_xpath, url))
         password_element.clear()
         password_element.send_keys(password)
         print(f"[WebDriver] Typed password into element: {password_field_xpath}")
 
         # Click submit button
         print(f"[WebDriver] Attempting to find submit button by XPath: {submit_button_xpath}")
-        submit_button_element = driver.find_element(By.XPATH, submit_button_xpath)
+        submit_button_element = driver.find_element(By.XPATH, _resolve_element_id(submit_button_xpath, url))
+        url_before_submit = driver.current_url
         submit_button_element.click()
         print(f"[WebDriver] Clicked submit button: {submit_button_xpath}")
         
-        driver.implicitly_wait(2) # Wait for potential page load/redirect
+        # Sign-in usually redirects (sometimes more than once); wait for the landing page to finish loading
+        readiness = wait_until_ready(driver, previous_url=url_before_submit, network_idle=True)
+        print(f"[WebDriver] After sign-in submit: {readiness.describe()}")
 
         new_url = driver.current_url
-        _current_url_in_driver = new_url.strip('/')
+        _session().current_url = new_url.strip('/')
         
-        _capture_and_save_screenshot(driver, SCREENSHOT_ACTION_FILENAME)
+        _capture_action_screenshot(driver)
         
-        return f"Attempted sign-in for user '{username}' on {url}. Current URL is now: {new_url}. Review screenshot."
+        return f"Attempted sign-in for user '{username}' on {url}. Current URL is now: {new_url} ({readiness.describe()}). Review screenshot."
 
     except NoSuchElementException as e:
-        _current_url_in_driver = None # Reset current URL as action failed
+        _session().current_url = None # Reset current URL as action failed
         element_xpath = str(e.msg).split("xpath: ")[-1].split("\n")[0] if e.msg else "unknown element"
         error_message = f"Error during sign-in on {url}: Could not find element with XPath '{element_xpath}'. Ensure XPaths are correct. Details: {str(e)}"
         print(f"[WebDriver ERROR] {error_message}")
         return error_message
     except TimeoutException as e:
-        _current_url_in_driver = driver.current_url.strip('/') if _driver else None # Update URL if possible
+        _session().current_url = driver.current_url.strip('/') if _session().driver else None # Update URL if possible
         error_message = f"Timeout during sign-in process on {url}. Page may have been slow to load or an element was not interactable in time. Details: {str(e)}"
         print(f"[WebDriver ERROR] {error_message}")
-        _capture_and_save_screenshot(driver, SCREENSHOT_ACTION_FILENAME) # Capture state on timeout
+        _capture_action_screenshot(driver) # Capture state on timeout
         return error_message
     except Exception as e:
-        _current_url_in_driver = driver.current_url.strip('/') if _driver else None # Update URL if possible
+        _session().current_url = driver.current_url.strip('/') if _session().driver else None # Update URL if possible
         error_message = f"An unexpected error occurred during sign-in on {url}: {str(e)}"
         print(f"[WebDriver ERROR] {error_message}")
-        if _driver: # Capture screenshot if driver still exists
-             _capture_and_save_screenshot(driver, SCREENSHOT_ACTION_FILENAME)
+        if _session().driver: # Capture screenshot if driver still exists
+             _capture_action_screenshot(driver)
         return error_message
 
 # Note: The agent instructions will need to guide the LLM on how to use these tools sequentially.
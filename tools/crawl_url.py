@@ -1,5 +1,30 @@
-import requests
-import markdownify
+import threading
+
+HTTP_TIMEOUT = 15 # seconds
+HTTP_USER_AGENT = ("Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) "
+                   "Chrome/124.0 Safari/537.36")
+
+_http_session = None
+_http_session_lock = threading.Lock()
+
+
+def http_session():
+    """Returns the process-wide requests.Session, so connections (and TLS handshakes) are reused across fetches."""
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                # Imported here so importing the agent does not pay for requests
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=32, pool_maxsize=32)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers["User-Agent"] = HTTP_USER_AGENT
+                _http_session = session
+    return _http_session
+
 
 def load_page(url: str) -> str:
     """
@@ -7,10 +32,14 @@ def load_page(url: str) -> str:
     """
     if not can_crawl(url):
         return f"URL {url} is not crawlable."
-    
+
     try:
-        page = requests.get(url)
-        return markdownify.markdownify(page.content)
+        import markdownify
+        from tools.page_store import store_page
+        page = http_session().get(url, timeout=HTTP_TIMEOUT)
+        markdown = markdownify.markdownify(page.content)
+        store_page(markdown, url, page.url) # Searchable with search_fetched_pages
+        return markdown
     except Exception as e:
         return f"Error loading page {url}: {e}"
 
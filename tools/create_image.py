@@ -1,6 +1,3 @@
-from google import genai
-from google.genai import types
-from PIL import Image
 from io import BytesIO
 import base64
 import os
@@ -9,14 +6,25 @@ import os
 from dotenv import load_dotenv
 load_dotenv()
 
+from tools.session_context import get_session_id
+from server.shared_state import publish_image_event
+from server.image_store import find_session_image, image_file, image_relpath, register_image
 
 
+# The Gemini client (and google.genai / PIL) are created on first use rather than at
+# import, so importing the agent has no network or credential side effects.
+_client = None
 
-client = genai.Client()
+def _get_client():
+  global _client
+  if _client is None:
+    from google import genai
+    _client = genai.Client()
+  return _client
 
 def create_image(text_input: str, image_file_name: str) -> dict:
   """
-  Genrates an image based on the text input and saves it to the assets/images folder.
+  Genrates an image based on the text input and saves it to the session's folder under assets/images.
   
   Args:
     text_input (str): The text prompt to generate an image using gemini image generation model.
@@ -25,14 +33,20 @@ def create_image(text_input: str, image_file_name: str) -> dict:
   Returns:
     dict: A dictionary containing the text and image file path.
   """
+  from google.genai import types
+  from PIL import Image
+
   contents = [text_input]
-  image_file_path = f'assets/images/{image_file_name}'
+  session_id = get_session_id()
+  image_file_path = image_file(image_relpath(session_id, image_file_name))
+  # Editing: start from the session's image of that name (found through the manifest)
+  existing_image_path = find_session_image(session_id, image_file_name)
   image = None
-  if os.path.exists(image_file_path):
-    image = Image.open(image_file_path)
+  if existing_image_path and os.path.exists(existing_image_path):
+    image = Image.open(existing_image_path)
     contents.append(image)
 
-  response = client.models.generate_content(
+  response = _get_client().models.generate_content(
       model="gemini-2.0-flash-preview-image-generation",
       contents=contents,
       config=types.GenerateContentConfig(
@@ -48,8 +62,12 @@ def create_image(text_input: str, image_file_name: str) -> dict:
       resultDict['text'] = part.text
     elif part.inline_data is not None:
       image = Image.open(BytesIO((part.inline_data.data)))
+      os.makedirs(os.path.dirname(image_file_path), exist_ok=True)
       image.save(image_file_path)
+      register_image(session_id, image_file_name)
       resultDict['image'] = image_file_path
+      # Let the worker holding this session's WebSocket know, whichever process we run in
+      publish_image_event(session_id, image_file_name)
       # image.show()
   resultDict['status'] = 'success'
   return resultDict
@@ -0,0 +1,123 @@
+"""
+Round-trip accounting and state caching for the session WebDrivers.
+
+Every Selenium call that reaches chromedriver (including WebElement methods) goes
+through `driver.execute(command, params)`, one HTTP round trip each. `instrument_driver`
+wraps that method to count and time every command, per command type and per tool call
+(see `track_webdriver_calls`), and reports the numbers to `server.metrics`.
+
+It also caches the few reads that only change on navigation (current URL, title,
+window handle). A cached value is reused only inside the same tool call, and any
+command that might change the page (navigation, clicks, typing, scripts) drops it.
+Every script counts, even a read-only one, so a loop polling document.readyState and
+the current URL sees a navigation as soon as it happens.
+"""
+import functools
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from selenium.webdriver.remote.command import Command
+
+from server import metrics
+
+_CACHED_COMMANDS = {Command.GET_CURRENT_URL, Command.GET_TITLE, Command.W3C_GET_CURRENT_WINDOW_HANDLE}
+
+# Commands that only read page state and therefore keep the cache.
+_READ_ONLY_COMMANDS = _CACHED_COMMANDS | {
+    Command.FIND_ELEMENT, Command.FIND_ELEMENTS, Command.FIND_CHILD_ELEMENT, Command.FIND_CHILD_ELEMENTS,
+    Command.GET_ELEMENT_TEXT, Command.GET_ELEMENT_TAG_NAME, Command.GET_ELEMENT_ATTRIBUTE,
+    Command.GET_ELEMENT_PROPERTY, Command.GET_ELEMENT_RECT, Command.GET_ELEMENT_VALUE_OF_CSS_PROPERTY,
+    Command.GET_ELEMENT_ARIA_ROLE, Command.GET_ELEMENT_ARIA_LABEL, Command.IS_ELEMENT_ENABLED,
+    Command.IS_ELEMENT_SELECTED, Command.GET_PAGE_SOURCE, Command.SCREENSHOT, Command.ELEMENT_SCREENSHOT,
+    Command.W3C_GET_WINDOW_HANDLES, Command.GET_WINDOW_RECT, Command.GET_TIMEOUTS, Command.SET_TIMEOUTS,
+}
+
+# Number of WebDriver commands issued by one tool call.
+COMMAND_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class ToolCallStats:
+    """WebDriver commands issued by one tool call."""
+
+    def __init__(self, tool: str):
+        self.tool = tool
+        self.commands = 0
+        self.seconds = 0.0
+        self.cache_hits = 0
+        self.by_command: Dict[str, list] = {} # command -> [count, seconds]
+
+    def add(self, command: str, elapsed: float) -> None:
+        self.commands += 1
+        self.seconds += elapsed
+        entry = self.by_command.setdefault(command, [0, 0.0])
+        entry[0] += 1
+        entry[1] += elapsed
+
+    def summary(self) -> str:
+        slowest = sorted(self.by_command.items(), key=lambda item: -item[1][1])[:3]
+        detail = ", ".join(f"{name} x{count} {seconds:.3f}s" for name, (count, seconds) in slowest)
+        return (f"{self.tool}: {self.commands} WebDriver commands in {self.seconds:.3f}s, "
+                f"{self.cache_hits} served from cache ({detail})")
+
+    def record(self) -> None:
+        metrics.increment("webdriver_tool_calls_total", tool=self.tool)
+        metrics.observe("webdriver_tool_call_commands", self.commands, buckets=COMMAND_COUNT_BUCKETS, tool=self.tool)
+        metrics.observe("webdriver_tool_call_seconds", self.seconds, tool=self.tool)
+        if self.commands or self.cache_hits:
+            print(f"[WebDriver] {self.summary()}")
+
+
+_current_call: ContextVar[Optional[ToolCallStats]] = ContextVar("webdriver_tool_call", default=None)
+
+
+def instrument_driver(driver):
+    """Wraps `driver.execute` with per-command accounting and the navigation-scoped state cache."""
+    if getattr(driver, "_execute_uninstrumented", None) is not None:
+        return driver
+    original_execute = driver.execute
+    cache: Dict[str, tuple] = {} # command -> (tool call it was read in, response)
+
+    def execute(driver_command: str, params: Optional[Dict] = None):
+        call = _current_call.get()
+        if driver_command in _CACHED_COMMANDS and call is not None:
+            cached = cache.get(driver_command)
+            if cached is not None and cached[0] is call:
+                call.cache_hits += 1
+                metrics.increment("webdriver_cache_hits_total", command=driver_command)
+                return cached[1]
+        if driver_command not in _READ_ONLY_COMMANDS:
+            cache.clear()
+
+        start = time.perf_counter()
+        try:
+            response = original_execute(driver_command, params)
+        finally:
+            elapsed = time.perf_counter() - start
+            metrics.increment("webdriver_commands_total", command=driver_command)
+            metrics.observe("webdriver_command_seconds", elapsed, command=driver_command)
+            if call is not None:
+                call.add(driver_command, elapsed)
+        if driver_command in _CACHED_COMMANDS and call is not None:
+            cache[driver_command] = (call, response)
+        return response
+
+    driver._execute_uninstrumented = original_execute
+    driver.execute = execute
+    return driver
+
+
+def track_webdriver_calls(func):
+    """Decorator for browser tools: accounts the WebDriver commands issued while the tool runs."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if _current_call.get() is not None:
+            return func(*args, **kwargs) # Nested tool call; the outer one accounts for it
+        stats = ToolCallStats(func.__name__)
+        token = _current_call.set(stats)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current_call.reset(token)
+            stats.record()
+    return wrapper
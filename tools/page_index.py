@@ -0,0 +1,117 @@
+"""
+Incremental BM25 index over stored pages (see tools/page_store.py).
+
+Pages are split into passages of about PASSAGE_CHARS characters at paragraph or line
+breaks. Each passage is a BM25 document in an inverted index (term -> {passage id: term
+frequency}), so adding or evicting a page only touches that page's postings and a
+search scores just the passages that contain a query term.
+"""
+import heapq
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+PASSAGE_CHARS = 1000
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+_TOKEN = re.compile(r"[^\W_]+", re.UNICODE)
+_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have how in is it its of on or that the this to was were "
+    "what when where which who why will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN.findall(text.lower()) if len(token) > 1 and token not in _STOPWORDS]
+
+
+def split_passages(markdown: str, length: int = PASSAGE_CHARS) -> List[Tuple[int, int]]:
+    """[start, end) offsets of consecutive passages, cut at paragraph, line or sentence breaks when possible."""
+    bounds, start = [], 0
+    while start < len(markdown):
+        end = min(len(markdown), start + length)
+        if end < len(markdown):
+            for separator in ("\n\n", "\n", ". ", " "):
+                cut = markdown.rfind(separator, start + length // 2, end)
+                if cut != -1:
+                    end = cut + len(separator)
+                    break
+        bounds.append((start, end))
+        start = end
+    return bounds
+
+
+class Passage:
+    __slots__ = ("page", "start", "end", "length")
+
+    def __init__(self, page, start: int, end: int, length: int):
+        self.page = page # tools.page_store.StoredPage
+        self.start = start
+        self.end = end
+        self.length = length # in tokens
+
+    @property
+    def text(self) -> str:
+        return self.page.markdown[self.start:self.end]
+
+
+class PageIndex:
+    def __init__(self):
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._passages: Dict[int, Passage] = {}
+        self._page_passages: Dict[str, List[int]] = {} # content hash -> passage ids
+        self._total_length = 0
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self._passages)
+
+    def add_page(self, page) -> None:
+        if page.content_hash in self._page_passages:
+            return
+        ids = []
+        for start, end in split_passages(page.markdown):
+            counts = Counter(tokenize(page.markdown[start:end]))
+            if not counts:
+                continue
+            passage_id = self._next_id
+            self._next_id += 1
+            length = sum(counts.values())
+            self._passages[passage_id] = Passage(page, start, end, length)
+            self._total_length += length
+            for term, frequency in counts.items():
+                self._postings.setdefault(term, {})[passage_id] = frequency
+            ids.append(passage_id)
+        self._page_passages[page.content_hash] = ids
+
+    def remove_page(self, content_hash: str) -> None:
+        for passage_id in self._page_passages.pop(content_hash, []):
+            passage = self._passages.pop(passage_id)
+            self._total_length -= passage.length
+            for term in set(tokenize(passage.text)):
+                postings = self._postings.get(term)
+                if postings is not None:
+                    postings.pop(passage_id, None)
+                    if not postings:
+                        del self._postings[term]
+
+    def search(self, query: str, k: int = 5) -> List[Tuple[float, Passage]]:
+        """The k best passages for the query by BM25 score, best first."""
+        count = len(self._passages)
+        if not count:
+            return []
+        average_length = self._total_length / count
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for passage_id, frequency in postings.items():
+                length = self._passages[passage_id].length
+                norm = frequency + BM25_K1 * (1 - BM25_B + BM25_B * length / average_length)
+                scores[passage_id] = scores.get(passage_id, 0.0) + idf * frequency * (BM25_K1 + 1) / norm
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [(score, self._passages[passage_id]) for passage_id, score in best]
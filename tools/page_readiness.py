@@ -0,0 +1,139 @@
+"""
+Readiness waits for browser actions.
+
+`driver.implicitly_wait(n)` does not wait for anything: it only changes how long every
+later `find_element` keeps retrying, so each failed lookup afterwards becomes slower.
+Instead, after an action we wait for the signal that actually means "done":
+
+- navigation committed: the URL changed and the new document is parsed,
+- DOM quiet: a MutationObserver saw no changes for `quiet_ms`,
+- network idle: no new resource finished loading for `idle_ms` (Resource Timing).
+
+Every wait has a deadline and returns as soon as its signal fires. `wait_until_ready`
+combines them and reports which signal fired and how long it took. ADK runs the sync
+browser tools on the event loop, so its deadline is capped at MAX_READY_WAIT_SECONDS:
+a longer wait would stall audio and WebSocket traffic for every session in the worker.
+"""
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+DOM_QUIET_MS = 300
+NETWORK_IDLE_MS = 500
+MAX_READY_WAIT_SECONDS = float(os.getenv("MAX_READY_WAIT_SECONDS", "3"))
+DEFAULT_READY_TIMEOUT = MAX_READY_WAIT_SECONDS
+
+_DOM_QUIET_SCRIPT = """
+const [quietMs, timeoutMs, done] = arguments;
+const start = performance.now();
+let last = start;
+const observer = new MutationObserver(() => { last = performance.now(); });
+observer.observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+(function poll() {
+    const now = performance.now();
+    if (document.readyState !== 'loading' && now - last >= quietMs) { observer.disconnect(); return done(true); }
+    if (now - start >= timeoutMs) { observer.disconnect(); return done(false); }
+    setTimeout(poll, 25);
+})();
+"""
+
+_NETWORK_IDLE_SCRIPT = """
+const [idleMs, timeoutMs, done] = arguments;
+const start = performance.now();
+let count = performance.getEntriesByType('resource').length;
+let lastChange = start;
+(function poll() {
+    const now = performance.now();
+    const current = performance.getEntriesByType('resource').length;
+    if (current !== count) { count = current; lastChange = now; }
+    if (document.readyState === 'complete' && now - lastChange >= idleMs) return done(true);
+    if (now - start >= timeoutMs) return done(false);
+    setTimeout(poll, 50);
+})();
+"""
+
+
+@dataclass
+class Readiness:
+    """Which signal ended the wait ("navigation", "dom_quiet", "network_idle" or "timeout") and how long it took."""
+    signal: str
+    waited: float
+
+    def describe(self) -> str:
+        if self.signal == "timeout":
+            return f"page still changing after {self.waited:.2f}s"
+        return f"page ready after {self.waited:.2f}s ({self.signal.replace('_', ' ')})"
+
+
+def _run_async_wait(driver, script: str, window_ms: int, timeout: float) -> bool:
+    # The script deadline is enforced in the page; the WebDriver script timeout is a backstop.
+    driver.set_script_timeout(timeout + 5)
+    return bool(driver.execute_async_script(script, window_ms, int(timeout * 1000)))
+
+
+def wait_for_dom_quiet(driver, quiet_ms: int = DOM_QUIET_MS, timeout: float = DEFAULT_READY_TIMEOUT) -> bool:
+    """True once the DOM has not changed for `quiet_ms`. Raises WebDriverException if the page unloads meanwhile."""
+    return _run_async_wait(driver, _DOM_QUIET_SCRIPT, quiet_ms, timeout)
+
+
+def wait_for_network_idle(driver, idle_ms: int = NETWORK_IDLE_MS, timeout: float = DEFAULT_READY_TIMEOUT) -> bool:
+    """True once the load event fired and no resource completed for `idle_ms`."""
+    return _run_async_wait(driver, _NETWORK_IDLE_SCRIPT, idle_ms, timeout)
+
+
+def wait_for_navigation(driver, previous_url: str, timeout: float = DEFAULT_READY_TIMEOUT) -> bool:
+    """True once the URL differs from `previous_url` and the new document has been parsed."""
+    from selenium.webdriver.support.ui import WebDriverWait
+
+    def committed(d):
+        try:
+            return d.current_url != previous_url and d.execute_script("return document.readyState") != "loading"
+        except WebDriverException:
+            return False # Between documents
+    try:
+        WebDriverWait(driver, timeout, poll_frequency=0.05).until(committed)
+        return True
+    except TimeoutException:
+        return False
+
+
+def wait_until_ready(driver, previous_url: Optional[str] = None, timeout: float = DEFAULT_READY_TIMEOUT,
+                     network_idle: bool = False, quiet_ms: int = DOM_QUIET_MS) -> Readiness:
+    """
+    Waits after an action until the page settles. If the action navigates away from
+    `previous_url`, waits for the new document to commit and then settle; otherwise waits
+    for the DOM to go quiet. With `network_idle`, also waits for resource loading to stop.
+    `timeout` is capped at MAX_READY_WAIT_SECONDS.
+    """
+    start = time.perf_counter()
+    deadline = start + min(timeout, MAX_READY_WAIT_SECONDS)
+    remaining = lambda: max(0.0, deadline - time.perf_counter())
+    signal = "dom_quiet"
+    try:
+        settled = wait_for_dom_quiet(driver, quiet_ms, remaining())
+    except WebDriverException:
+        settled = False # The document unloaded under the script: a navigation started
+    try:
+        navigated = previous_url is not None and driver.current_url != previous_url
+    except WebDriverException:
+        navigated = True
+    if navigated:
+        signal = "navigation"
+        settled = wait_for_navigation(driver, previous_url, remaining())
+        if settled:
+            try:
+                wait_for_dom_quiet(driver, quiet_ms, remaining())
+            except WebDriverException:
+                pass # Redirected again; the commit is what we report
+    if settled and network_idle and remaining() > 0:
+        try:
+            if wait_for_network_idle(driver, NETWORK_IDLE_MS, remaining()):
+                signal = "network_idle"
+            else:
+                settled = False
+        except WebDriverException:
+            settled = False
+    return Readiness(signal if settled else "timeout", time.perf_counter() - start)
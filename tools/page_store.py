@@ -0,0 +1,204 @@
+"""
+Per-session store of fetched page markdown, read back in sections.
+
+Page tools used to return only the first 2000 characters; reading further meant
+browsing again (navigation, markdownify, screenshot). Now the full markdown is kept
+here, keyed by URL and content hash, and `read_page_section` serves the next chunk
+from memory without touching the browser or the network.
+
+A cursor is "<content hash>:<offset>", so a cursor from an older version of a page
+is detected after the page was fetched again with different content. Each session
+keeps at most MAX_PAGES_PER_SESSION pages and MAX_SESSION_CHARS characters,
+evicting the least recently used page first.
+
+Stored pages are also indexed for `search_fetched_pages` (BM25, see tools/page_index.py).
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from tools.page_index import PageIndex
+from tools.session_context import get_session_id
+
+SECTION_CHARS = 4000
+SEARCH_RESULTS_MAX = 10
+MAX_PAGES_PER_SESSION = int(os.getenv("PAGE_STORE_MAX_PAGES", "20"))
+MAX_SESSION_CHARS = int(os.getenv("PAGE_STORE_MAX_CHARS", str(2_000_000)))
+
+
+def _normalize_url(url: str) -> str:
+    return (url or "").strip().rstrip("/")
+
+
+class StoredPage:
+    def __init__(self, url: str, markdown: str):
+        self.url = url
+        self.markdown = markdown
+        self.content_hash = hashlib.sha1(markdown.encode("utf-8", "replace")).hexdigest()[:12]
+        self.stored_at = time.time()
+
+
+class PageStore:
+    """LRU of one session's pages. Several URLs (requested and final after redirects) can point at one page."""
+
+    def __init__(self):
+        self._pages: "OrderedDict[str, StoredPage]" = OrderedDict() # by content hash
+        self._urls: Dict[str, str] = {} # normalized URL -> content hash
+        self._chars = 0
+        self._lock = threading.Lock()
+        self.index = PageIndex()
+
+    def put(self, markdown: str, *urls: str) -> StoredPage:
+        page = StoredPage(urls[0], markdown)
+        with self._lock:
+            existing = self._pages.get(page.content_hash)
+            if existing is not None:
+                page = existing
+                self._pages.move_to_end(page.content_hash)
+            else:
+                self._pages[page.content_hash] = page
+                self._chars += len(markdown)
+                self.index.add_page(page)
+            for url in urls:
+                if url:
+                    self._urls[_normalize_url(url)] = page.content_hash
+            self._evict()
+        return page
+
+    def get(self, url: str = "", content_hash: str = "") -> Optional[StoredPage]:
+        with self._lock:
+            content_hash = content_hash or self._urls.get(_normalize_url(url), "")
+            page = self._pages.get(content_hash)
+            if page is not None:
+                self._pages.move_to_end(content_hash)
+            return page
+
+    def search(self, query: str, k: int):
+        with self._lock:
+            return self.index.search(query, k)
+
+    def _evict(self) -> None:
+        while self._pages and (len(self._pages) > MAX_PAGES_PER_SESSION or self._chars > MAX_SESSION_CHARS):
+            if len(self._pages) == 1:
+                break # Keep the newest page even if it alone is over the budget
+            content_hash, page = self._pages.popitem(last=False)
+            self._chars -= len(page.markdown)
+            self.index.remove_page(content_hash)
+            self._urls = {url: h for url, h in self._urls.items() if h != content_hash}
+
+
+_stores: Dict[str, PageStore] = {}
+
+
+def _store(session_id: Optional[str] = None) -> PageStore:
+    session_id = session_id or get_session_id()
+    if session_id not in _stores:
+        _stores[session_id] = PageStore()
+    return _stores[session_id]
+
+
+# Pages stored while `recording_stored_pages` is active, so a cached tool result can
+# put them back (see tools/tool_cache.py)
+_recording: ContextVar[Optional[List[Tuple[str, Tuple[str, ...]]]]] = ContextVar("page_store_recording", default=None)
+
+
+def store_page(markdown: str, *urls: str) -> StoredPage:
+    """Keeps a fetched page for the current session under all given URLs (requested, final)."""
+    recording = _recording.get()
+    if recording is not None:
+        recording.append((markdown, urls))
+    return _store().put(markdown, *urls)
+
+
+@contextmanager
+def recording_stored_pages():
+    """Collects the (markdown, urls) of every page stored inside the block."""
+    pages = []
+    token = _recording.set(pages)
+    try:
+        yield pages
+    finally:
+        _recording.reset(token)
+
+
+def drop_session_pages(session_id: str) -> None:
+    _stores.pop(session_id, None)
+
+
+def _section_bounds(markdown: str, offset: int, length: int) -> Tuple[int, int]:
+    """[offset, end) of the section starting at offset, ending at a paragraph or line break when possible."""
+    end = min(len(markdown), offset + length)
+    if end < len(markdown):
+        window_start = offset + length // 2
+        for separator in ("\n\n", "\n", ". ", " "):
+            cut = markdown.rfind(separator, window_start, end)
+            if cut != -1:
+                end = cut + len(separator)
+                break
+    return offset, end
+
+
+def format_section(page: StoredPage, offset: int = 0, length: int = SECTION_CHARS) -> str:
+    """One section of a stored page with a header and the cursor for the next section."""
+    start, end = _section_bounds(page.markdown, offset, length)
+    total = len(page.markdown)
+    header = f"[{page.url} | characters {start}-{end} of {total}]"
+    if end < total:
+        footer = f"[More content: call read_page_section with url='{page.url}' and cursor='{page.content_hash}:{end}']"
+    else:
+        footer = "[End of page]"
+    return f"{header}\n{page.markdown[start:end]}\n{footer}"
+
+
+def read_page_section(url: str, cursor: str = "", offset: int = 0) -> str:
+    """
+    Returns the next part of a page that was already fetched with browse_url, browse_urls or fetch_page,
+    instantly and without loading the page again. Pass the cursor given at the end of the previous part,
+    or a character offset to jump to. Each part ends with the cursor for the following one.
+    """
+    content_hash = ""
+    if cursor:
+        content_hash, _, cursor_offset = cursor.partition(":")
+        try:
+            offset = int(cursor_offset)
+        except ValueError:
+            return f"Error: invalid cursor '{cursor}'. Use the cursor exactly as given in the previous part."
+    store = _store()
+    page = store.get(content_hash=content_hash) if content_hash else store.get(url=url)
+    if page is None and content_hash:
+        page = store.get(url=url)
+        if page is not None:
+            return (f"Note: {url} was fetched again and its content changed since that cursor; "
+                    f"continuing in the new version.\n" + format_section(page, min(max(0, offset), len(page.markdown))))
+    if page is None:
+        return f"No stored content for {url}. Fetch it first with fetch_page or browse_url."
+    if offset < 0 or (offset and offset >= len(page.markdown)):
+        return f"Offset {offset} is outside {url}, which has {len(page.markdown)} characters."
+    return format_section(page, offset)
+
+
+def search_fetched_pages(query: str, k: int = 5) -> List[Dict[str, str]]:
+    """
+    Searches every page already fetched in this conversation (fetch_page, load_page, browse_url,
+    browse_urls) and returns the k most relevant passages with their URL, in milliseconds.
+    Use it to find a specific fact in pages you have loaded instead of reading them in full.
+    Each result has 'url', 'passage', 'score' and a 'cursor' for read_page_section to continue reading there.
+    """
+    k = max(1, min(int(k), SEARCH_RESULTS_MAX))
+    results = _store().search(query, k)
+    if not results:
+        return [{"note": f"No passages match '{query}'. Fetch the relevant pages first."}]
+    return [
+        {
+            "url": passage.page.url,
+            "score": f"{score:.2f}",
+            "passage": passage.text.strip(),
+            "cursor": f"{passage.page.content_hash}:{passage.start}",
+        }
+        for score, passage in results
+    ]
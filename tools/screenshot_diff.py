@@ -0,0 +1,127 @@
+"""
+Change detection for browser action screenshots.
+
+Consecutive screenshots of an interactive session are usually almost identical
+(typing into a field, hovering, a small dropdown). `ScreenshotDiffer` compares each
+new capture with the previous one and decides what to send:
+
+- "unchanged": nothing to send.
+- "delta": only the changed tiles, which the client pastes onto the previous frame.
+- "full": the whole screenshot (first frame, size change, large change, periodic keyframe).
+
+A 64-bit difference hash (dHash) is a cheap first pass: a large hash distance means the
+page changed substantially (navigation, scroll) and we go straight to a full frame.
+Otherwise a per-tile max-abs-difference on the pixels finds exactly what changed.
+"""
+from io import BytesIO
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from tools.screenshot_encoder import ScreenshotProfile, downscale, encode_image, get_profile
+
+TILE_SIZE = 64
+PIXEL_NOISE_THRESHOLD = 8 # Per-channel difference below this is treated as rendering noise
+MAX_DELTA_FRACTION = 0.35 # Above this share of changed tiles a full frame is cheaper
+HASH_FULL_FRAME_DISTANCE = 12 # dHash bits; beyond this skip tile diffing and send a full frame
+KEYFRAME_INTERVAL = 20 # Force a full frame now and then so clients can't drift
+
+
+def difference_hash(gray: np.ndarray) -> int:
+    """64-bit dHash of a grayscale image: area-average to 8x9 and compare horizontal neighbours."""
+    height, width = gray.shape
+    rows = np.linspace(0, height, 9, dtype=int)
+    cols = np.linspace(0, width, 10, dtype=int)
+    # Mean of each cell via a summed-area table, so the cost is one pass over the image.
+    integral = np.pad(gray.astype(np.float64).cumsum(0).cumsum(1), ((1, 0), (1, 0)))
+    sums = (integral[np.ix_(rows[1:], cols[1:])] - integral[np.ix_(rows[:-1], cols[1:])]
+            - integral[np.ix_(rows[1:], cols[:-1])] + integral[np.ix_(rows[:-1], cols[:-1])])
+    areas = np.outer(np.diff(rows), np.diff(cols))
+    cells = sums / np.maximum(areas, 1)
+    bits = (cells[:, 1:] > cells[:, :-1]).flatten()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def changed_tiles(previous: np.ndarray, current: np.ndarray, tile_size: int = TILE_SIZE) -> np.ndarray:
+    """Boolean grid (tile rows x tile cols) of tiles containing a pixel that changed beyond the noise threshold."""
+    height, width = current.shape[:2]
+    tile_rows = -(-height // tile_size)
+    tile_cols = -(-width // tile_size)
+    changed = np.abs(current.astype(np.int16) - previous.astype(np.int16)).max(axis=2) > PIXEL_NOISE_THRESHOLD
+    padded = np.zeros((tile_rows * tile_size, tile_cols * tile_size), dtype=bool)
+    padded[:height, :width] = changed
+    return padded.reshape(tile_rows, tile_size, tile_cols, tile_size).any(axis=(1, 3))
+
+
+def _encode_png(pixels: np.ndarray) -> bytes:
+    from PIL import Image
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, format="PNG", optimize=False)
+    return buffer.getvalue()
+
+
+class ScreenshotDiffer:
+    """Per-session state: the last frame the client has, and its id."""
+
+    def __init__(self, allow_delta: bool = True):
+        self.allow_delta = allow_delta # False for clients that cannot assemble tiles
+        self.previous: Optional[np.ndarray] = None
+        self.previous_hash: Optional[int] = None
+        self.frame_id = 0
+        self.frames_since_keyframe = 0
+
+    def reset(self) -> None:
+        """Forget the client's frame (e.g. it asked for a keyframe); the next frame is sent in full."""
+        self.previous = None
+        self.previous_hash = None
+
+    def process(self, png_bytes: bytes, profile: Optional[ScreenshotProfile] = None) -> Dict:
+        """
+        Downscales a new PNG screenshot to the profile and compares it with the previous frame.
+        Returns {"type": "unchanged"}, {"type": "full", "data": bytes, "mime_type": ...} or
+        {"type": "delta", "base_frame_id": n, "tiles": [{"x", "y", "w", "h", "data"}], ...}.
+        Full frames use the profile's format; tiles are PNG so the client's copy stays exact.
+        """
+        from PIL import Image
+        profile = profile or get_profile("desktop")
+        image = downscale(Image.open(BytesIO(png_bytes)).convert("RGB"), profile)
+        current = np.asarray(image)
+        height, width = current.shape[:2]
+        current_hash = difference_hash(current.mean(axis=2))
+        previous = self.previous
+
+        kind = "full"
+        grid = None
+        if (previous is not None and previous.shape == current.shape
+                and self.frames_since_keyframe < KEYFRAME_INTERVAL
+                and hamming_distance(current_hash, self.previous_hash) <= HASH_FULL_FRAME_DISTANCE):
+            grid = changed_tiles(previous, current)
+            if not grid.any():
+                return {"type": "unchanged", "frame_id": self.frame_id}
+            if self.allow_delta and grid.mean() <= MAX_DELTA_FRACTION:
+                kind = "delta"
+
+        base_frame_id = self.frame_id
+        self.frame_id += 1
+        self.previous = current
+        self.previous_hash = current_hash
+        frame = {"type": kind, "frame_id": self.frame_id, "width": width, "height": height}
+        if kind == "full":
+            self.frames_since_keyframe = 0
+            frame["data"] = encode_image(image, profile)
+            frame["mime_type"] = profile.mime_type
+            return frame
+
+        self.frames_since_keyframe += 1
+        tiles: List[Dict] = []
+        for row, col in zip(*np.nonzero(grid)):
+            y, x = int(row) * TILE_SIZE, int(col) * TILE_SIZE
+            tile = current[y:y + TILE_SIZE, x:x + TILE_SIZE]
+            tiles.append({"x": x, "y": y, "w": tile.shape[1], "h": tile.shape[0], "data": _encode_png(tile)})
+        frame["base_frame_id"] = base_frame_id
+        frame["tiles"] = tiles
+        return frame
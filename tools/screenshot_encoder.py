@@ -0,0 +1,81 @@
+"""
+Encoding stage for browser screenshots.
+
+Selenium always captures lossless PNG at the full window size (1920x1080), which is
+large to base64 over the WebSocket. Before sending, screenshots are downscaled to the
+session's bandwidth profile and re-encoded as JPEG or WebP. Decoding, diffing and
+encoding are CPU-bound Pillow/NumPy work, so `render_frame` runs them in a small
+thread pool instead of on the event loop (Pillow releases the GIL while coding).
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from io import BytesIO
+from typing import Dict
+
+SCREENSHOT_ENCODER_WORKERS = int(os.getenv("SCREENSHOT_ENCODER_WORKERS", "2"))
+
+
+@dataclass(frozen=True)
+class ScreenshotProfile:
+    """How screenshots are encoded for one client."""
+    format: str # "JPEG" or "WEBP"
+    quality: int
+    max_width: int
+    max_height: int
+
+    @property
+    def mime_type(self) -> str:
+        return "image/webp" if self.format == "WEBP" else "image/jpeg"
+
+
+BANDWIDTH_PROFILES: Dict[str, ScreenshotProfile] = {
+    "desktop": ScreenshotProfile(format="JPEG", quality=80, max_width=1920, max_height=1080),
+    "mobile": ScreenshotProfile(format="WEBP", quality=60, max_width=960, max_height=540),
+}
+DEFAULT_PROFILE = "desktop"
+
+_pool = ThreadPoolExecutor(max_workers=SCREENSHOT_ENCODER_WORKERS, thread_name_prefix="screenshot-encoder")
+
+
+def get_profile(name: str) -> ScreenshotProfile:
+    """Returns the named bandwidth profile, falling back to desktop for unknown names."""
+    return BANDWIDTH_PROFILES.get((name or "").lower(), BANDWIDTH_PROFILES[DEFAULT_PROFILE])
+
+
+def downscale(image, profile: ScreenshotProfile):
+    """Shrinks a PIL image to fit the profile's max dimensions, keeping the aspect ratio."""
+    from PIL import Image
+    if image.width <= profile.max_width and image.height <= profile.max_height:
+        return image
+    scale = min(profile.max_width / image.width, profile.max_height / image.height)
+    size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    # reducing_gap makes Pillow do a cheap integer pre-reduction before the Lanczos pass
+    return image.resize(size, Image.LANCZOS, reducing_gap=2.0)
+
+
+def encode_image(image, profile: ScreenshotProfile) -> bytes:
+    """Encodes an RGB PIL image with the profile's format and quality."""
+    buffer = BytesIO()
+    if profile.format == "WEBP":
+        image.save(buffer, format="WEBP", quality=profile.quality, method=4)
+    else:
+        image.save(buffer, format="JPEG", quality=profile.quality, optimize=True)
+    return buffer.getvalue()
+
+
+def encode_png_screenshot(png_bytes: bytes, profile: ScreenshotProfile) -> bytes:
+    """Re-encodes a Selenium PNG screenshot according to the profile."""
+    from PIL import Image
+    image = Image.open(BytesIO(png_bytes)).convert("RGB")
+    return encode_image(downscale(image, profile), profile)
+
+
+async def render_frame(png_bytes: bytes, differ, profile: ScreenshotProfile) -> Dict:
+    """
+    Runs `differ.process` (decode, downscale, diff, encode) on the encoder pool. Takes the
+    arguments in the order of a `pop_screenshot_captures` tuple.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_pool, differ.process, png_bytes, profile)
@@ -0,0 +1,11 @@
+from contextvars import ContextVar
+
+# The WebSocket session a tool call belongs to. main.py sets it before starting the
+# ADK runner; the tasks the runner spawns copy the context, so tools (which ADK calls
+# from those tasks) see the right session without it appearing in their signatures.
+current_session_id: ContextVar[str] = ContextVar("current_session_id", default="default")
+
+
+def get_session_id() -> str:
+    """Returns the session id of the tool call currently running."""
+    return current_session_id.get()
@@ -0,0 +1,164 @@
+"""
+Session-scoped memoization of idempotent tool calls.
+
+The live agent often repeats `fetch_page` or `load_page` on the same URL within one
+conversation. Each tool in
+google_search_agent/agent.py declares a `ToolCachePolicy`:
+
+- `ttl > 0`: the tool is idempotent; results are reused for `ttl` seconds, keyed by
+  session, tool and arguments. Errors are never cached. Only tools whose whole effect is
+  their result qualify: browser tools that navigate, screenshot or hand out element
+  handles do not.
+- `stores_pages=True`: the pages the call put in the page store (tools/page_store.py) are
+  stored again on a hit, so cursors in the cached result stay readable after eviction.
+- `mutates=True`: the tool changes the page (click, type, sign-in, ...); after it runs,
+  every cached result for its URL in the session is dropped.
+- `resets=True`: the tool resets the browser (close_browser_session); the whole
+  session cache is dropped.
+
+`browse_url` and `find_interactive_elements` are deliberately not memoized. Their
+effect is more than their text: browse_url navigates the session's Chrome and queues
+a screenshot, and find_interactive_elements hands out the element handles that later
+click/type calls resolve. A replayed result would skip both. Caching only their
+read-only part would need a page-state hash, which costs a browser round trip. That
+is about what the single element-snapshot script costs, so there is nothing to save.
+For repeated reads of the same page, the agent is steered to fetch_page, which is cached.
+
+Hits, misses and invalidations go to `server.metrics` (`tool_cache_*`).
+Set TOOL_CACHE=0 to disable.
+"""
+import functools
+import inspect
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Tuple
+
+from server import metrics
+from tools.page_store import recording_stored_pages, store_page
+from tools.session_context import get_session_id
+
+TOOL_CACHE_ENABLED = os.getenv("TOOL_CACHE", "1") != "0"
+MAX_ENTRIES_PER_SESSION = 256
+
+
+@dataclass(frozen=True)
+class ToolCachePolicy:
+    ttl: float = 0 # Seconds a result may be reused; 0 = never cached
+    mutates: bool = False # Drops the session's cached results for the tool's URL after running
+    resets: bool = False # Drops all of the session's cached results after running
+    stores_pages: bool = False # Replays the call's store_page() side effect on a hit
+    url_arg: str = "url"
+
+
+def _normalize_url(url: Any) -> str:
+    return str(url or "").strip().rstrip("/")
+
+
+class _SessionCache:
+    def __init__(self):
+        self.entries: Dict[Tuple, Tuple[float, str, Any, List]] = {} # key -> (expires_at, url, result, stored pages)
+        self.lock = threading.Lock()
+
+    def get(self, key: Tuple):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            return entry
+
+    def put(self, key: Tuple, url: str, ttl: float, result: Any, pages: List) -> None:
+        with self.lock:
+            if len(self.entries) >= MAX_ENTRIES_PER_SESSION:
+                # Drop the entry closest to expiry
+                del self.entries[min(self.entries, key=lambda k: self.entries[k][0])]
+            self.entries[key] = (time.monotonic() + ttl, url, result, pages)
+
+    def invalidate_url(self, url: str = None) -> int:
+        """Drops the entries for the URL, or all entries if url is None."""
+        with self.lock:
+            stale = [key for key, entry in self.entries.items() if url is None or entry[1] == url]
+            for key in stale:
+                del self.entries[key]
+            return len(stale)
+
+
+_sessions: Dict[str, _SessionCache] = {}
+
+
+def _session_cache() -> _SessionCache:
+    session_id = get_session_id()
+    if session_id not in _sessions:
+        _sessions[session_id] = _SessionCache()
+    return _sessions[session_id]
+
+
+def drop_session_tool_cache(session_id: str) -> None:
+    _sessions.pop(session_id, None)
+
+
+def _is_error(result: Any) -> bool:
+    return isinstance(result, str) and result.startswith(("Error", "Timeout", "No active"))
+
+
+def _freeze(value: Any):
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+
+def memoize_tool(func: Callable, policy: ToolCachePolicy) -> Callable:
+    """Wraps a sync tool function according to its policy; the signature and docstring seen by the model are kept."""
+    signature = inspect.signature(func)
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        url = _normalize_url(bound.arguments.get(policy.url_arg))
+        cache = _session_cache()
+
+        if policy.ttl > 0:
+            key = (name,) + tuple(
+                (arg, url if arg == policy.url_arg else _freeze(value)) for arg, value in bound.arguments.items()
+            )
+            entry = cache.get(key)
+            if entry is not None:
+                metrics.increment("tool_cache_requests_total", tool=name, result="hit")
+                print(f"[TOOL CACHE] {name} hit for {url or key}")
+                for markdown, urls in entry[3]:
+                    store_page(markdown, *urls)
+                return entry[2]
+            metrics.increment("tool_cache_requests_total", tool=name, result="miss")
+
+        with recording_stored_pages() as pages:
+            result = func(*args, **kwargs)
+
+        if policy.mutates or policy.resets:
+            dropped = cache.invalidate_url(None if policy.resets else url)
+            if dropped:
+                metrics.increment("tool_cache_invalidations_total", dropped, tool=name)
+                print(f"[TOOL CACHE] {name} on {url or 'session'} invalidated {dropped} cached results")
+        elif policy.ttl > 0 and not _is_error(result):
+            cache.put(key, url, policy.ttl, result, pages if policy.stores_pages else [])
+        return result
+
+    return wrapper
+
+
+def memoize_tools(tools: List, policies: Dict[str, ToolCachePolicy]) -> List:
+    """Applies `memoize_tool` to every plain function in `tools` that has a policy; other tools pass through."""
+    if not TOOL_CACHE_ENABLED:
+        return list(tools)
+    return [
+        memoize_tool(tool, policies[tool.__name__])
+        if inspect.isfunction(tool) and tool.__name__ in policies else tool
+        for tool in tools
+    ]